@@ -1,13 +1,28 @@
+import json
+import multiprocessing
+import os
 from flask import Flask
 from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
 from flasgger import Swagger
 
 mongoDb=PyMongo()
-def create_app():
+def create_app(start_background=True):
     app = Flask(__name__)
     app.config["MONGO_URI"] = "mongodb://mongodb:27017/mobile"
     app.config['JWT_SECRET_KEY'] = 'super-secret-key'  # 비밀키 설정
+    # 카탈로그 핫 리로드 설정 (0이면 파일 감시 비활성화)
+    app.config['CATALOG_WATCH_INTERVAL'] = float(os.getenv('CATALOG_WATCH_INTERVAL', '30'))
+    app.config['CATALOG_ADMIN_TOKEN'] = os.getenv('CATALOG_ADMIN_TOKEN')
+    # CATALOG_SOURCE=mongo 일 때 변경된 상품만 주기적으로 동기화 (초)
+    app.config['CATALOG_SYNC_INTERVAL'] = float(os.getenv('CATALOG_SYNC_INTERVAL', '10'))
+    # 앱 시작 시 카탈로그를 미리 로드 (/readyz 가 준비 완료를 알려줌)
+    app.config['CATALOG_EAGER_WARMUP'] = os.getenv('CATALOG_EAGER_WARMUP', '1') != '0'
+    # 랭킹 점수 가중치 덮어쓰기, 예: {"ranking": {"rating_weight": 2.5}}
+    app.config['RANKING_WEIGHTS'] = json.loads(os.getenv('RANKING_WEIGHTS') or '{}')
+    # 트렌딩 랭킹: top-K 갱신 주기와 이벤트 카운트를 MongoDB 에 모아서 쓰는 주기 (초)
+    app.config['TRENDING_REFRESH_INTERVAL'] = float(os.getenv('TRENDING_REFRESH_INTERVAL', '5'))
+    app.config['TRENDING_FLUSH_INTERVAL'] = float(os.getenv('TRENDING_FLUSH_INTERVAL', '10'))
     jwt = JWTManager(app)
     
     # Swagger 설정
@@ -57,6 +72,22 @@ def create_app():
     app.register_blueprint(user_bp, url_prefix='/users')
     app.register_blueprint(product_bp, url_prefix='/products')
     
+    # 첫 요청 전에 카탈로그를 백그라운드에서 로드하고,
+    # 데이터셋 파일이 바뀌면 백그라운드에서 카탈로그를 다시 로드
+    from .services.product_service import ProductService
+    from .services.scoring import configure_weight_sets
+    configure_weight_sets(app.config['RANKING_WEIGHTS'])
+    # 병렬 CSV 파싱 워커(spawn)는 메인 모듈(run.py)을 다시 import 하므로 create_app 도 다시 실행됨:
+    # 워커 안에서는 카탈로그 로딩/감시/동기화/트렌딩 스레드를 시작하지 않음
+    # (parent_process() 는 메인 모듈을 import 한 뒤에야 설정되므로 프로세스 이름으로 판별)
+    # start_background=False: 요청을 받지 않는 프로세스 (예: debug 리로더의 부모 프로세스, run.py 참고)
+    if start_background and multiprocessing.current_process().name == 'MainProcess':
+        if app.config['CATALOG_EAGER_WARMUP']:
+            ProductService.warmup_catalog(background=True)
+        ProductService.start_catalog_watcher(app.config['CATALOG_WATCH_INTERVAL'])
+        ProductService.start_catalog_sync(app.config['CATALOG_SYNC_INTERVAL'])
+        ProductService.start_trending(app.config['TRENDING_REFRESH_INTERVAL'], app.config['TRENDING_FLUSH_INTERVAL'])
+
     # 기타 확장 초기화 코드 등 추가 가능
     
     return app
@@ -1,7 +1,25 @@
-from flask import Blueprint
+from flask import Blueprint, jsonify
+from app.services.product_service import ProductService
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route("/", methods=["GET"])
 def home():
     return "hello"
+
+
+@main_bp.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    준비 상태 확인 API - 카탈로그가 로드된 뒤에만 200을 반환
+    ---
+    responses:
+      200:
+        description: 트래픽을 받을 준비 완료
+      503:
+        description: 카탈로그 로딩 중
+    tags:
+      - Health
+    """
+    status = ProductService.catalog_status()
+    return jsonify(status), 200 if status['ready'] else 503
@@ -1,9 +1,23 @@
-from flask import Blueprint, request, jsonify
+import math
+from flask import Blueprint, request, jsonify, current_app
 from app.services.user_service import UserService
-from flask_jwt_extended import create_access_token, create_refresh_token,jwt_required,get_jwt_identity
-from app.services.product_service import ProductService
+from flask_jwt_extended import create_access_token, create_refresh_token,jwt_required,get_jwt_identity,verify_jwt_in_request
+from app.services.product_service import ProductService, UnsupportedFilterError
+from app.services.pagination import CursorError
+from app.services.fragments import dumps, json_response
+from app.services.result_cache import MAX_CACHED_TOP_N, normalize_query
 product_bp = Blueprint('products', __name__)
 
+PRICE_RANGE_ERROR = 'price_min and price_max must be finite numbers'
+
+
+def _price_range():
+    """price_min/price_max 쿼리 파라미터. nan/inf 가 있으면 None (float() 는 통과하지만 범위로 쓸 수 없음)"""
+    bounds = (request.args.get('price_min', type=float), request.args.get('price_max', type=float))
+    if any(bound is not None and not math.isfinite(bound) for bound in bounds):
+        return None
+    return bounds
+
 
 # 추천 엔드포인트: 사용자 피부정보(또는 간단한 요청)를 받아 추천 목록 반환
 # @product_bp.route('/recommend', methods=['POST'])
@@ -93,12 +107,44 @@ def search_product():
         required: false
         type: integer
         description: Number of results to return (default 1)
+      - name: mode
+        in: query
+        required: false
+        type: string
+        enum: [fuzzy, bm25]
+        description: fuzzy (default) matches product names; bm25 ranks by the query words found in name, brand, highlights and ingredients
+      - name: autocorrect
+        in: query
+        required: false
+        type: boolean
+        description: Correct misspelled words against product and brand names before searching (default true)
+      - name: price_min
+        in: query
+        required: false
+        type: number
+        description: Only products whose lowest listed price is at least this (USD)
+      - name: price_max
+        in: query
+        required: false
+        type: number
+        description: Only products whose lowest listed price is at most this (USD)
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: next_cursor of the previous page; resumes from where that page ended
     responses:
       200:
         description: 검색 성공
         schema:
           type: object
           properties:
+            corrected_query:
+              type: string
+              description: The query actually searched when a word was corrected (null otherwise)
+            next_cursor:
+              type: string
+              description: Cursor of the next page (null on the last page)
             results:
               type: array
               items:
@@ -118,13 +164,15 @@ def search_product():
                     type: integer
                   similarity_score:
                     type: number
+                    description: Name similarity, or the BM25 relevance in bm25 mode
       400:
-        description: 검색 실패
+        description: 검색 실패 (query 누락, 알 수 없는 mode, 유한하지 않은 가격 범위 또는 잘못되었거나 만료된 cursor)
     tags:
       - Products
     """
     query = request.args.get('query')
-    if not query:
+    cursor = request.args.get('cursor')
+    if not query and not cursor:
         return jsonify({'message': 'query parameter is required'}), 400
     
     try:
@@ -132,8 +180,117 @@ def search_product():
     except Exception:
         top_n = 1
     
-    results = ProductService.find_product_by_name(query, top_n=top_n)
-    return jsonify({'results': results}), 200
+    # bm25: 이름/브랜드/하이라이트/성분 전체에서 검색어 단어로 순위 매김
+    mode = request.args.get('mode', 'fuzzy')
+    if mode not in ('fuzzy', 'bm25'):
+        return jsonify({'message': 'mode must be fuzzy or bm25'}), 400
+    
+    autocorrect = request.args.get('autocorrect', 'true').lower() != 'false'
+    prices = _price_range()
+    if prices is None:
+        return jsonify({'message': PRICE_RANGE_ERROR}), 400
+    price_min, price_max = prices
+    # 대소문자/공백/유니코드 표기만 다른 검색어는 같은 검색어로 취급
+    query = normalize_query(query) if not cursor else None
+    
+    def search():
+        # 오타 교정은 첫 페이지에서만 (다음 페이지는 cursor 에 교정된 검색어가 들어 있음)
+        searched, corrected_query = query, None
+        if query and autocorrect:
+            corrected = ProductService.correct_query(query)
+            if corrected != query:
+                searched = corrected_query = corrected
+        results, next_cursor = ProductService.search_products_page(
+            searched, page_size=top_n, cursor=cursor, raw=True,
+            price_min=price_min, price_max=price_max, mode=mode)
+        # 상품 항목은 미리 직렬화된 JSON 조각을 이어 붙여 응답
+        return dumps({'results': results, 'next_cursor': next_cursor, 'corrected_query': corrected_query})
+    
+    try:
+        if top_n > MAX_CACHED_TOP_N:
+            body = search()
+        else:
+            # 같은 요청의 완성된 응답을 카탈로그 세대별로 캐시
+            body = ProductService.cached_response(
+                ('search', query, cursor, top_n, mode, autocorrect, price_min, price_max), search)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    return current_app.response_class(body, mimetype='application/json')
+
+
+@product_bp.route('/suggest', methods=['GET'])
+def suggest_products():
+    """
+    검색어 자동완성 API - 입력 중인 접두어로 시작하는 상품/브랜드/카테고리 이름
+    ---
+    parameters:
+      - name: prefix
+        in: query
+        required: true
+        type: string
+        description: What has been typed so far (case-insensitive)
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        description: Suggestions per kind, most popular first (default and max 10)
+    responses:
+      200:
+        description: 자동완성 성공
+        schema:
+          type: object
+          properties:
+            prefix:
+              type: string
+            products:
+              type: array
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: string
+                  product_name:
+                    type: string
+                  brand_name:
+                    type: string
+                  image_url:
+                    type: string
+            brands:
+              type: array
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                  count:
+                    type: integer
+            categories:
+              type: array
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                  count:
+                    type: integer
+                  level:
+                    type: string
+      400:
+        description: prefix 누락
+    tags:
+      - Products
+    """
+    prefix = request.args.get('prefix', '')
+    if not prefix.strip():
+        return jsonify({'message': 'prefix parameter is required'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', 10))
+    except Exception:
+        limit = 10
+    
+    # 접두어마다 미리 계산해 둔 인기순 상위 목록을 조회 (전체 스캔 없음)
+    return jsonify(ProductService.suggest(prefix, limit))
 
 
 @product_bp.route('/<product_id>/similar', methods=['GET'])
@@ -152,6 +309,11 @@ def get_similar_products(product_id):
         required: false
         type: integer
         description: Number of similar products to return (default 10)
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: next_cursor of the previous page; resumes from where that page ended
     responses:
       200:
         description: 유사 제품 조회 성공
@@ -160,6 +322,9 @@ def get_similar_products(product_id):
           properties:
             product_id:
               type: string
+            next_cursor:
+              type: string
+              description: Cursor of the next page (null on the last page)
             similar_products:
               type: array
               items:
@@ -179,6 +344,8 @@ def get_similar_products(product_id):
                     type: string
                   similarity_score:
                     type: number
+      400:
+        description: 잘못되었거나 만료된 cursor
       404:
         description: 제품을 찾을 수 없음
     tags:
@@ -188,22 +355,136 @@ def get_similar_products(product_id):
         top_n = int(request.args.get('top_n', 10))
     except Exception:
         top_n = 10
+    cursor = request.args.get('cursor')
     
-    similar = ProductService.find_similar_products(product_id, top_n=top_n)
+    def similar_products():
+        similar, next_cursor = ProductService.similar_products_page(product_id, page_size=top_n, cursor=cursor, raw=True)
+        if not similar and not cursor:
+            # 404 응답은 캐시하지 않음
+            return None
+        return dumps({
+            'product_id': product_id,
+            'similar_products': similar,
+            'next_cursor': next_cursor
+        })
+    
+    try:
+        if top_n > MAX_CACHED_TOP_N:
+            body = similar_products()
+        else:
+            # 같은 요청의 완성된 응답을 카탈로그 세대별로 캐시
+            body = ProductService.cached_response(('similar', product_id, cursor, top_n), similar_products)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
     
-    if not similar:
+    if body is None:
         return jsonify({
             'message': 'Product not found or no similar products available',
             'product_id': product_id,
             'similar_products': []
         }), 404
     
-    return jsonify({
-        'product_id': product_id,
-        'similar_products': similar
-    }), 200
+    return current_app.response_class(body, mimetype='application/json')
+
 
 
+MAX_BATCH_IDS = 100
+MAX_EVENTS_PER_REQUEST = 100
+
+
+@product_bp.route('/events', methods=['POST'])
+def post_events():
+    """
+    사용자 행동 이벤트 수집 API (트렌딩 랭킹용)
+    ---
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            events:
+              type: array
+              description: Up to 100 events
+              items:
+                type: object
+                properties:
+                  product_id:
+                    type: string
+                  type:
+                    type: string
+                    description: "'view', 'search_click' or 'favorite'"
+    responses:
+      202:
+        description: 이벤트 접수 (메모리에 모았다가 주기적으로 MongoDB 에 반영)
+        schema:
+          type: object
+          properties:
+            accepted:
+              type: integer
+            rejected:
+              type: integer
+      400:
+        description: JSON 객체가 아닌 body, events 누락 또는 개수 초과
+    tags:
+      - Products
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'message': 'body must be a JSON object'}), 400
+    events = data.get('events')
+    if events is None and data.get('product_id'):
+        # 단일 이벤트 {"product_id": ..., "type": ...} 도 허용
+        events = [data]
+    if not isinstance(events, list) or not events:
+        return jsonify({'message': 'events is required'}), 400
+    if len(events) > MAX_EVENTS_PER_REQUEST:
+        return jsonify({'message': f'at most {MAX_EVENTS_PER_REQUEST} events per request'}), 400
+
+    accepted, rejected = ProductService.record_events(events)
+    return jsonify({'accepted': accepted, 'rejected': rejected}), 202
+
+
+@product_bp.route('/batch', methods=['GET'])
+def get_products_batch():
+    """
+    여러 상품 한 번에 조회 API
+    ---
+    parameters:
+      - name: ids
+        in: query
+        required: true
+        type: string
+        description: Comma-separated product IDs (max 100), e.g. "P510337,P516958"
+    responses:
+      200:
+        description: 조회 성공 (카탈로그에 없는 ID는 missing 으로 반환)
+        schema:
+          type: object
+          properties:
+            products:
+              type: array
+              items:
+                type: object
+            missing:
+              type: array
+              items:
+                type: string
+      400:
+        description: ids 누락 또는 개수 초과
+    tags:
+      - Products
+    """
+    ids = [pid.strip() for raw in request.args.getlist('ids') for pid in raw.split(',') if pid.strip()]
+    if not ids:
+        return jsonify({'message': 'ids parameter is required'}), 400
+    if len(ids) > MAX_BATCH_IDS:
+        return jsonify({'message': f'at most {MAX_BATCH_IDS} ids per request'}), 400
+
+    products, missing = ProductService.get_products_batch(ids)
+    return jsonify({'products': products, 'missing': missing}), 200
+
 
 @product_bp.route('/detail', methods=['GET'])
 def parse_product_detail():
@@ -295,6 +576,31 @@ def ranking(top_n=20):
         required: false
         type: string
         description: Category level - 'primary', 'secondary', or 'tertiary' (default is 'primary')
+      - name: price_min
+        in: query
+        required: false
+        type: number
+        description: Only products whose lowest listed price is at least this (USD)
+      - name: price_max
+        in: query
+        required: false
+        type: number
+        description: Only products whose lowest listed price is at most this (USD)
+      - name: mode
+        in: query
+        required: false
+        type: string
+        description: "'popular' (rating/reviews, default), 'trending' (recent user events, no cursor paging) or 'personalized' (popular blended with the relevance to the JWT user's skin type)"
+      - name: Authorization
+        in: header
+        required: false
+        type: string
+        description: "Bearer access token; only read in personalized mode"
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: next_cursor of the previous page; resumes from where that page ended
     responses:
       200:
         description: 글로벌 상품 랭킹 조회 성공
@@ -305,8 +611,14 @@ def ranking(top_n=20):
               type: array       
               items:
                 type: object
+            next_cursor:
+              type: string
+              description: Cursor of the next page (null on the last page)
+            segment:
+              type: string
+              description: Skin-type segment used in personalized mode (null = not personalized)
       400:
-        description: 글로벌 상품 랭킹 조회 실패
+        description: 글로벌 상품 랭킹 조회 실패 (잘못되었거나 만료된 cursor, 유한하지 않은 가격 범위, 또는 RANKING_BACKEND=mongo 에서 가격 필터 사용)
         schema:
           type: object
           properties:
@@ -318,19 +630,39 @@ def ranking(top_n=20):
     top_n = request.args.get('top_n', default=20, type=int)
     category = request.args.get('category', default=None, type=str)
     level = request.args.get('level', default='primary', type=str)
+    prices = _price_range()
+    if prices is None:
+        return jsonify({'message': PRICE_RANGE_ERROR}), 400
+    price_min, price_max = prices
     
     # Validate level
     if level not in ['primary', 'secondary', 'tertiary']:
         level = 'primary'
     
-    if category:
-        # Use category-based ranking
-        recs = ProductService.get_ranking_by_category(category=category, level=level, top_n=top_n)
-    else:
-        # Use original global ranking
-        recs = ProductService.get_global_ranking(top_n=top_n)
+    # 트렌딩 모드는 몇 초마다 갱신되는 top-K 에서 바로 반환 (페이지 없음)
+    if request.args.get('mode') == 'trending':
+        recs = ProductService.get_trending_ranking(category=category, level=level, top_n=top_n, raw=True,
+                                                   price_min=price_min, price_max=price_max)
+        return json_response({'ranking': recs, 'next_cursor': None})
+    
+    # 개인화 모드: 로그인한 유저의 피부 타입 세그먼트 랭킹 (토큰이 없거나 피부 타입이 없으면 일반 랭킹)
+    segment = None
+    if request.args.get('mode') == 'personalized':
+        try:
+            verify_jwt_in_request(optional=True)
+            segment = ProductService.skin_segment(get_jwt_identity())
+        except Exception:
+            segment = None
+    
+    # category 가 없으면 글로벌 랭킹, cursor 가 있으면 이전 페이지의 다음 위치부터
+    try:
+        recs, next_cursor = ProductService.get_ranking_page(
+            category=category, level=level, page_size=top_n, cursor=request.args.get('cursor'), segment=segment,
+            raw=True, price_min=price_min, price_max=price_max)
+    except (CursorError, UnsupportedFilterError) as e:
+        return jsonify({'message': str(e)}), 400
     
-    return jsonify({'ranking': recs}), 200
+    return json_response({'ranking': recs, 'next_cursor': next_cursor, 'segment': segment})
 
 
 @product_bp.route('/categories', methods=['GET'])
@@ -344,6 +676,16 @@ def get_categories():
         required: false
         type: string
         description: Category level - 'primary', 'secondary', 'tertiary', or 'all' (default is 'primary')
+      - name: price_min
+        in: query
+        required: false
+        type: number
+        description: Only products whose lowest listed price is at least this (USD)
+      - name: price_max
+        in: query
+        required: false
+        type: number
+        description: Only products whose lowest listed price is at most this (USD)
     responses:
       200:
         description: 카테고리 목록 조회 성공
@@ -360,7 +702,7 @@ def get_categories():
                   count:
                     type: integer
       400:
-        description: 카테고리 목록 조회 실패
+        description: 카테고리 목록 조회 실패 (유한하지 않은 가격 범위)
     tags:
       - Products
     """
@@ -370,5 +712,136 @@ def get_categories():
     if level not in ['primary', 'secondary', 'tertiary', 'all']:
         level = 'primary'
     
-    categories = ProductService.get_categories_list(level=level)
-    return jsonify(categories), 200
\ No newline at end of file
+    prices = _price_range()
+    if prices is None:
+        return jsonify({'message': PRICE_RANGE_ERROR}), 400
+    
+    categories = ProductService.get_categories_list(level=level, price_min=prices[0], price_max=prices[1])
+    return jsonify(categories), 200
+
+
+@product_bp.route('/categories/tree', methods=['GET'])
+def get_category_tree():
+    """
+    카테고리 트리 조회 API (primary → secondary → tertiary, 상품 수 포함)
+    ---
+    parameters:
+      - name: If-None-Match
+        in: header
+        required: false
+        type: string
+        description: ETag of a previous response; 304 if the tree has not changed
+    responses:
+      200:
+        description: 카테고리 트리 조회 성공
+        schema:
+          type: object
+          properties:
+            generation:
+              type: integer
+            categories:
+              type: array
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                  count:
+                    type: integer
+                  children:
+                    type: array
+                    items:
+                      type: object
+      304:
+        description: 변경 없음 (ETag 일치)
+    tags:
+      - Products
+    """
+    # 카탈로그 세대마다 한 번 만들어 둔 JSON 을 그대로 반환
+    body, etag = ProductService.get_category_tree()
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+@product_bp.route('/admin/reload', methods=['POST'])
+def reload_catalog():
+    """
+    상품 카탈로그 재로딩 API (관리자용)
+    ---
+    parameters:
+      - name: X-Admin-Token
+        in: header
+        required: true
+        type: string
+        description: Must match the CATALOG_ADMIN_TOKEN environment variable
+    responses:
+      202:
+        description: 재로딩 시작 (백그라운드에서 새 세대를 만든 뒤 교체)
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+            generation:
+              type: integer
+      403:
+        description: 관리자 토큰이 없거나 올바르지 않음
+      409:
+        description: 이미 재로딩 중
+    tags:
+      - Products
+    """
+    admin_token = current_app.config.get('CATALOG_ADMIN_TOKEN')
+    if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+        return jsonify({'message': 'forbidden'}), 403
+
+    started = ProductService.reload_catalog(background=True)
+    generation = ProductService.catalog_generation()
+    if not started:
+        return jsonify({'message': 'reload already in progress', 'generation': generation}), 409
+    return jsonify({'message': 'reload started', 'generation': generation}), 202
+
+
+@product_bp.route('/admin/cache-stats', methods=['GET'])
+def get_result_cache_stats():
+    """
+    검색/유사 제품 응답 캐시 통계 API (관리자용)
+    ---
+    parameters:
+      - name: X-Admin-Token
+        in: header
+        required: true
+        type: string
+        description: Must match the CATALOG_ADMIN_TOKEN environment variable
+    responses:
+      200:
+        description: 캐시 통계 조회 성공 (hits/misses 는 서버 시작 이후 누적)
+        schema:
+          type: object
+          properties:
+            hits:
+              type: integer
+            misses:
+              type: integer
+            hit_ratio:
+              type: number
+            entries:
+              type: integer
+              description: Responses cached for the current catalog generation
+            max_entries:
+              type: integer
+            ttl_seconds:
+              type: number
+            generation:
+              type: integer
+      403:
+        description: 관리자 토큰이 없거나 올바르지 않음
+    tags:
+      - Products
+    """
+    admin_token = current_app.config.get('CATALOG_ADMIN_TOKEN')
+    if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+        return jsonify({'message': 'forbidden'}), 403
+
+    return jsonify(ProductService.result_cache_stats())
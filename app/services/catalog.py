@@ -0,0 +1,524 @@
+"""
+Columnar in-memory product catalog.
+
+Products are stored column by column (typed arrays for numbers, interned ids
+for brand/category strings) instead of one csv.DictReader dict per row, so
+ranking and search can run tight passes over a single column.
+"""
+import ast
+import csv
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+CATEGORY_LEVELS = ('primary', 'secondary', 'tertiary')
+# ProductRecord fields the per-generation indexes (search, suggestions,
+# categories, segment relevance) are built from; the other fields of a row
+# can be overwritten in place
+INDEXED_FIELDS = frozenset({'product_name', 'brand_name', 'primary_category', 'secondary_category',
+                            'tertiary_category', 'highlights_raw', 'ingredients_raw'})
+
+
+def parse_price(value) -> float:
+    """Parse a display price such as '$22.00' or '$15.00 - $45.00'.
+
+    Returns the lower bound of the range, or 0.0 when the value can't be parsed.
+    """
+    return parse_price_range(value)[0]
+
+
+def parse_price_range(value) -> Tuple[float, float]:
+    """Parse a display price into (min, max); a single price gives min == max.
+
+    Unparseable parts become 0.0.
+    """
+    if not value:
+        return 0.0, 0.0
+    parts = str(value).replace('$', '').split('-')
+    bounds = []
+    for part in (parts[0], parts[-1]):
+        try:
+            bounds.append(float(part.strip().replace(',', '')))
+        except Exception:
+            bounds.append(0.0)
+    low, high = bounds
+    return low, max(low, high)
+
+
+def _split_list_fallback(value: str) -> List[str]:
+    # fallback: try to split on common separators
+    v = value.strip()
+    if v.startswith("[") and v.endswith("]"):
+        v = v[1:-1]
+    return [p.strip().strip("'\"") for p in v.split(",") if p.strip()]
+
+
+def parse_list_field(value) -> List[str]:
+    """Parse a list column such as "['Hydrating', 'Good for: Dryness']".
+
+    A small scanner for Python list-of-string literals; it avoids the cost of
+    ast.literal_eval on the whole value (only literals with backslash escapes
+    are handed to ast) and falls back to splitting on commas for malformed input.
+    """
+    if not value:
+        return []
+    s = value.strip()
+    if len(s) < 2 or s[0] != '[' or s[-1] != ']':
+        return _split_list_fallback(s)
+    out = []
+    i, end = 1, len(s) - 1
+    while i < end:
+        c = s[i]
+        if c in ' ,\t\r\n':
+            i += 1
+            continue
+        if c == "'" or c == '"':
+            j = s.find(c, i + 1)
+            if j < 0 or j > end:
+                return _split_list_fallback(s)
+            if '\\' not in s[i + 1:j]:
+                out.append(s[i + 1:j].strip())
+                i = j + 1
+                continue
+            # slow path: find the real closing quote and let ast decode the escapes
+            j = i + 1
+            while j < end and s[j] != c:
+                j += 2 if s[j] == '\\' else 1
+            if j >= end:
+                return _split_list_fallback(s)
+            try:
+                out.append(str(ast.literal_eval(s[i:j + 1])).strip())
+            except Exception:
+                return _split_list_fallback(s)
+            i = j + 1
+        else:
+            # bare element such as a number
+            j = s.find(',', i)
+            if j < 0 or j > end:
+                j = end
+            out.append(s[i:j].strip())
+            i = j
+    return out
+
+
+class ListColumn:
+    """List-of-strings column kept as raw literals and parsed on first access.
+
+    Parsed rows are cached per product, so columns most requests never read
+    (ingredients, highlights) cost only their raw string at load time.
+    """
+
+    def __init__(self, raw: Sequence[str] = None):
+        self.raw = raw if raw is not None else []
+        self._parsed: Dict[int, List[str]] = {}
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, i: int) -> List[str]:
+        parsed = self._parsed.get(i)
+        if parsed is None:
+            parsed = self._parsed[i] = parse_list_field(self.raw[i])
+        return parsed
+
+    def peek(self, i: int) -> List[str]:
+        """Row `i` parsed without caching it, for scans over the whole catalog."""
+        parsed = self._parsed.get(i)
+        return parsed if parsed is not None else parse_list_field(self.raw[i])
+
+    def append(self, raw: str):
+        self.raw.append(raw)
+
+    def set(self, i: int, raw: str):
+        self.raw[i] = raw
+        self._parsed.pop(i, None)
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except Exception:
+        return 0.0
+
+
+def _to_int(value) -> int:
+    try:
+        return int(float(value or 0))
+    except Exception:
+        return 0
+
+
+class ProductRecord(NamedTuple):
+    """One normalized product, as produced by normalize_row()."""
+    product_id: str
+    product_name: str
+    brand_name: str
+    rating: float
+    reviews: int
+    loves_count: int
+    list_price: str
+    price_min: float
+    price_max: float
+    image_url: str
+    target_url: str
+    sku_id: str
+    primary_category: str
+    secondary_category: str
+    tertiary_category: str
+    # raw list literals; ProductCatalog parses them lazily
+    highlights_raw: str
+    ingredients_raw: str
+
+
+class ProductVariant(NamedTuple):
+    """One SKU of a product (CSV rows sharing a product_id are folded into variants)."""
+    sku_id: str
+    list_price: str
+    price_min: float
+    price_max: float
+    image_url: str
+
+
+def format_price_range(low: float, high: float) -> str:
+    if low == high:
+        return f'${low:.2f}'
+    return f'${low:.2f} - ${high:.2f}'
+
+
+def _list_literal(value) -> str:
+    # products documents may already hold real lists
+    if isinstance(value, list):
+        return repr([str(v) for v in value])
+    return value or ''
+
+
+def normalize_row(row: dict) -> ProductRecord:
+    """Normalize one raw CSV row (or products document) into a ProductRecord."""
+    # 'price' is the fresh value written by Sephora detail refreshes
+    list_price = str(row.get('price') or row.get('listPrice') or '')
+    price_min, price_max = parse_price_range(list_price)
+    if not price_min and row.get('price_usd'):
+        price_min = price_max = _to_float(row.get('price_usd'))
+    return ProductRecord(
+        product_id=row.get('product_id') or '',
+        product_name=row.get('product_name') or '',
+        brand_name=(row.get('brand_name') or '').strip(),
+        rating=_to_float(row.get('rating')),
+        reviews=_to_int(row.get('reviews')),
+        loves_count=_to_int(row.get('loves_count')),
+        list_price=list_price,
+        price_min=price_min,
+        price_max=price_max,
+        image_url=row.get('image_url') or '',
+        target_url=row.get('target_url') or '',
+        sku_id=row.get('skuId') or '',
+        primary_category=(row.get('primary_category') or '').strip(),
+        secondary_category=(row.get('secondary_category') or '').strip(),
+        tertiary_category=(row.get('tertiary_category') or '').strip(),
+        highlights_raw=_list_literal(row.get('highlights')),
+        ingredients_raw=_list_literal(row.get('ingredients')),
+    )
+
+
+class StringTable:
+    """Interned string column values. Id 0 is always the empty string."""
+
+    def __init__(self):
+        self.values: List[str] = ['']
+        self.lower: List[str] = ['']
+        # id -> id of the first value with the same lowercase form,
+        # so case-insensitive equality becomes an int comparison
+        self.canonical = array('I', [0])
+        self._ids: Dict[str, int] = {'': 0}
+        self._lower_ids: Dict[str, int] = {'': 0}
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_values(cls, values) -> 'StringTable':
+        """Rebuild a table whose ids follow the order of `values` (values[0] == '')."""
+        table = cls()
+        for value in values:
+            table.intern(value)
+        return table
+
+    def intern(self, value) -> int:
+        value = (value or '').strip()
+        sid = self._ids.get(value)
+        if sid is not None:
+            return sid
+        sid = len(self.values)
+        lowered = value.lower()
+        self._ids[value] = sid
+        self.values.append(value)
+        self.lower.append(lowered)
+        self.canonical.append(self._lower_ids.setdefault(lowered, sid))
+        return sid
+
+    def find(self, value) -> int:
+        """Return the canonical id for a case-insensitive value, or -1 if unknown."""
+        return self._lower_ids.get((value or '').strip().lower(), -1)
+
+
+class ProductCatalog:
+    """Typed, column-oriented product table.
+
+    Row i of the catalog is spread across the columns below; numeric columns
+    are `array` instances and brand/category columns hold StringTable ids.
+    """
+
+    def __init__(self):
+        self.product_ids: List[str] = []
+        self.names: List[str] = []
+        self.names_lower: List[str] = []
+        self.brand_ids = array('I')
+        self.brands = StringTable()
+        self.category_ids = {level: array('I') for level in CATEGORY_LEVELS}
+        self.categories = {level: StringTable() for level in CATEGORY_LEVELS}
+        self.ratings = array('d')
+        self.reviews = array('q')
+        self.loves_counts = array('q')
+        self.price_min = array('d')
+        self.price_max = array('d')
+        self.list_prices: List[str] = []
+        self.image_urls: List[str] = []
+        self.target_urls: List[str] = []
+        self.sku_ids: List[str] = []
+        self.highlights = ListColumn()
+        self.ingredients = ListColumn()
+        # row -> SKU variants, only for products with more than one SKU;
+        # single-SKU products are described by the row's own columns
+        self.multi_variants: Dict[int, List[ProductVariant]] = {}
+        # product_id -> row, built on first lookup (see index_of)
+        self._positions: Optional[Dict[str, int]] = None
+        # per-generation structures derived from the columns (see derived)
+        self._derived: Dict[str, object] = {}
+        # mmap backing the columns when loaded from a snapshot
+        self.snapshot = None
+        # assigned by CatalogManager when the catalog is published
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def append(self, record: ProductRecord):
+        """Append one normalized product to the columns."""
+        self.names.append(record.product_name)
+        self.names_lower.append(record.product_name.lower())
+        self.brand_ids.append(self.brands.intern(record.brand_name))
+        self.category_ids['primary'].append(self.categories['primary'].intern(record.primary_category))
+        self.category_ids['secondary'].append(self.categories['secondary'].intern(record.secondary_category))
+        self.category_ids['tertiary'].append(self.categories['tertiary'].intern(record.tertiary_category))
+        self.ratings.append(record.rating)
+        self.reviews.append(record.reviews)
+        self.loves_counts.append(record.loves_count)
+        self.price_min.append(record.price_min)
+        self.price_max.append(record.price_max)
+        self.list_prices.append(record.list_price)
+        self.image_urls.append(record.image_url)
+        self.target_urls.append(record.target_url)
+        self.sku_ids.append(record.sku_id)
+        self.highlights.append(record.highlights_raw)
+        self.ingredients.append(record.ingredients_raw)
+        if self._positions is not None:
+            self._positions.setdefault(record.product_id, len(self.product_ids))
+        # len(catalog) follows product_ids, so append it last: concurrent
+        # readers never see a row whose other columns are not filled yet
+        self.product_ids.append(record.product_id)
+
+    def derived(self, key: str, factory):
+        """Return the structure cached under `key`, building it with factory(self) once.
+
+        Derived structures live as long as this catalog generation does.
+        """
+        value = self._derived.get(key)
+        if value is None:
+            value = self._derived[key] = factory(self)
+        return value
+
+    def index_of(self, product_id: str) -> int:
+        """Return the row of `product_id`, or -1 if it is not in the catalog."""
+        positions = self._positions
+        if positions is None:
+            positions = {}
+            for i, pid in enumerate(self.product_ids):
+                positions.setdefault(pid, i)
+            self._positions = positions
+        return positions.get(product_id, -1)
+
+    def update(self, i: int, record: ProductRecord):
+        """Overwrite row i in place. Only heap-backed (not snapshot) catalogs are writable."""
+        variants = None
+        if i in self.multi_variants:
+            record, variants = self._folded_row(i, record)
+        self.names[i] = record.product_name
+        self.names_lower[i] = record.product_name.lower()
+        self.brand_ids[i] = self.brands.intern(record.brand_name)
+        self.category_ids['primary'][i] = self.categories['primary'].intern(record.primary_category)
+        self.category_ids['secondary'][i] = self.categories['secondary'].intern(record.secondary_category)
+        self.category_ids['tertiary'][i] = self.categories['tertiary'].intern(record.tertiary_category)
+        self.ratings[i] = record.rating
+        self.reviews[i] = record.reviews
+        self.loves_counts[i] = record.loves_count
+        self.price_min[i] = record.price_min
+        self.price_max[i] = record.price_max
+        self.list_prices[i] = record.list_price
+        self.image_urls[i] = record.image_url
+        self.target_urls[i] = record.target_url
+        self.sku_ids[i] = record.sku_id
+        self.highlights.set(i, record.highlights_raw)
+        self.ingredients.set(i, record.ingredients_raw)
+        if variants is not None:
+            self.multi_variants[i] = variants
+
+    def set_popularity(self, i: int, rating: float, reviews: int, loves_count: int):
+        """Overwrite the popularity columns of row i.
+
+        Unlike update() this also works on snapshot catalogs: the three
+        read-only mapped columns are copied to the heap on the first write.
+        """
+        for name in ('ratings', 'reviews', 'loves_counts'):
+            column = getattr(self, name)
+            if isinstance(column, memoryview):
+                setattr(self, name, array(column.format, column))
+        self.ratings[i] = rating
+        self.reviews[i] = reviews
+        self.loves_counts[i] = loves_count
+
+    def with_changes(self, records: Sequence[ProductRecord]) -> 'ProductCatalog':
+        """Return a new heap-backed catalog: these rows (and variants) with `records` applied.
+
+        Records of known products overwrite their row as update() does, new
+        products are appended. This catalog itself is left untouched, so it
+        can keep serving readers until the copy is published.
+        """
+        catalog = ProductCatalog()
+        for i in range(len(self)):
+            catalog.append(self.record(i))
+        catalog.multi_variants = {i: list(variants) for i, variants in self.multi_variants.items()}
+        for record in records:
+            i = catalog.index_of(record.product_id)
+            if i < 0:
+                catalog.append(record)
+            else:
+                catalog.update(i, record)
+        return catalog
+
+    def variants(self, i: int) -> List[ProductVariant]:
+        variants = self.multi_variants.get(i)
+        if variants is not None:
+            return variants
+        return [ProductVariant(self.sku_ids[i], self.list_prices[i], self.price_min[i],
+                               self.price_max[i], self.image_urls[i])]
+
+    def _fold_variant(self, i: int, record: ProductRecord) -> Tuple[List[ProductVariant], Optional[Tuple[float, float]]]:
+        """Variants of product i with `record`'s SKU added (or replaced), and their price range (None if unpriced)."""
+        variants = list(self.variants(i))
+        variant = ProductVariant(record.sku_id, record.list_price, record.price_min,
+                                 record.price_max, record.image_url)
+        for k, existing in enumerate(variants):
+            if existing.sku_id == variant.sku_id:
+                variants[k] = variant
+                break
+        else:
+            variants.append(variant)
+        priced = [v for v in variants if v.price_min > 0]
+        if not priced:
+            return variants, None
+        return variants, (min(v.price_min for v in priced), max(v.price_max for v in priced))
+
+    def add_variant(self, i: int, record: ProductRecord):
+        """Fold another SKU row of product i into its variants and widen its price range."""
+        variants, prices = self._fold_variant(i, record)
+        if len(variants) > 1:
+            self.multi_variants[i] = variants
+        if prices is not None:
+            low, high = prices
+            self.price_min[i] = low
+            self.price_max[i] = high
+            self.list_prices[i] = format_price_range(low, high)
+
+    def _folded_row(self, i: int, record: ProductRecord) -> Tuple[ProductRecord, List[ProductVariant]]:
+        """Row i of a multi-SKU product as `record` (one of its SKUs) leaves it, and its new variants."""
+        variants, prices = self._fold_variant(i, record)
+        if record.sku_id != self.sku_ids[i]:
+            # another SKU than the one the row shows: only its variant changes
+            record = record._replace(sku_id=self.sku_ids[i], image_url=self.image_urls[i])
+        if prices is not None:
+            record = record._replace(price_min=prices[0], price_max=prices[1],
+                                     list_price=format_price_range(*prices))
+        return record, variants
+
+    def changed_fields(self, i: int, record: ProductRecord) -> Set[str]:
+        """Names of the ProductRecord fields update(i, record) would actually change
+        ('variants' if it changes only another SKU of a multi-SKU product).
+
+        A multi-SKU row is compared after folding the record into its variants,
+        and list fields as parsed lists, since a products document holds real
+        lists where the CSV holds their literal.
+        """
+        new, variants = self._folded_row(i, record) if i in self.multi_variants else (record, None)
+        old = self.record(i)
+        changed = {field for field in ProductRecord._fields
+                   if field not in ('highlights_raw', 'ingredients_raw') and getattr(new, field) != getattr(old, field)}
+        if parse_list_field(new.highlights_raw) != self.highlights.peek(i):
+            changed.add('highlights_raw')
+        if parse_list_field(new.ingredients_raw) != self.ingredients.peek(i):
+            changed.add('ingredients_raw')
+        if variants is not None and variants != self.multi_variants[i]:
+            changed.add('variants')
+        return changed
+
+    def record(self, i: int) -> ProductRecord:
+        """Reassemble row i as a ProductRecord."""
+        return ProductRecord(
+            product_id=self.product_ids[i],
+            product_name=self.names[i],
+            brand_name=self.brand_name(i),
+            rating=self.ratings[i],
+            reviews=self.reviews[i],
+            loves_count=self.loves_counts[i],
+            list_price=self.list_prices[i],
+            price_min=self.price_min[i],
+            price_max=self.price_max[i],
+            image_url=self.image_urls[i],
+            target_url=self.target_urls[i],
+            sku_id=self.sku_ids[i],
+            primary_category=self.category('primary', i),
+            secondary_category=self.category('secondary', i),
+            tertiary_category=self.category('tertiary', i),
+            highlights_raw=self.highlights.raw[i],
+            ingredients_raw=self.ingredients.raw[i],
+        )
+
+    def brand_name(self, i: int) -> str:
+        return self.brands.values[self.brand_ids[i]]
+
+    def category(self, level: str, i: int) -> str:
+        return self.categories[level].values[self.category_ids[level][i]]
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'ProductCatalog':
+        builder = CatalogBuilder()
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                builder.add(normalize_row(row))
+        return builder.catalog
+
+
+class CatalogBuilder:
+    """Builds a ProductCatalog with one row per product_id.
+
+    Further rows of an already-seen product (other SKUs) are folded into that
+    product's variants, so ranking and search never see duplicate products.
+    """
+
+    def __init__(self):
+        self.catalog = ProductCatalog()
+
+    def add(self, record: ProductRecord):
+        i = self.catalog.index_of(record.product_id)
+        if i < 0:
+            self.catalog.append(record)
+        else:
+            self.catalog.add_variant(i, record)
@@ -0,0 +1,105 @@
+"""
+Chunked, parallel CSV ingestion for large catalogs.
+
+The file is split into byte ranges that end on record boundaries (a newline
+outside any quoted field). Each range is parsed and transformed in a worker
+process, and results are handed back in file order while only a bounded
+number of chunks is in flight, so peak memory follows the chunk size rather
+than the file size.
+"""
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from app.services.catalog import CatalogBuilder, ProductCatalog, normalize_row
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def read_header(path: str) -> Tuple[List[str], int]:
+    """Return the CSV field names and the byte offset of the first data record."""
+    with open(path, 'rb') as f:
+        line = f.readline()
+        return next(csv.reader([line.decode('utf-8-sig')])), f.tell()
+
+
+def iter_chunk_ranges(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES, start: int = None) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) byte ranges of roughly `chunk_bytes` holding whole records.
+
+    Quoted fields may contain newlines; a newline only ends a record when the
+    number of quote characters before it is even ('""' escapes keep parity).
+    """
+    if start is None:
+        start = read_header(path)[1]
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pending = b''        # bytes from `start` on that are not yet yielded
+        in_quotes = False    # quote parity at the start of `pending`
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                if pending:
+                    yield start, start + len(pending)
+                return
+            pending += block
+            if len(pending) < chunk_bytes:
+                continue
+            cut = pending.rfind(b'\n')
+            while cut >= 0 and in_quotes ^ (pending.count(b'"', 0, cut) & 1):
+                cut = pending.rfind(b'\n', 0, cut)
+            if cut < 0:
+                continue
+            end = start + cut + 1
+            yield start, end
+            in_quotes ^= bool(pending.count(b'"', 0, cut + 1) & 1)
+            pending = pending[cut + 1:]
+            start = end
+
+
+def _process_chunk(path: str, start: int, end: int, fieldnames: List[str], transform: Callable) -> list:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames)
+    return [transform(row) for row in reader]
+
+
+def iter_transformed_chunks(path: str, transform: Callable = normalize_row,
+                            workers: Optional[int] = None,
+                            chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+                            max_in_flight: Optional[int] = None) -> Iterator[list]:
+    """Yield, in file order, one list of `transform(row)` results per chunk.
+
+    `transform` must be a picklable module-level function. Files that fit in
+    a single chunk are handled in-process without starting a pool.
+    """
+    fieldnames, data_start = read_header(path)
+    if os.path.getsize(path) - data_start <= chunk_bytes:
+        yield _process_chunk(path, data_start, os.path.getsize(path), fieldnames, transform)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    ranges = iter_chunk_ranges(path, chunk_bytes, start=data_start)
+    # spawn: callers may be threaded (catalog reload), which fork does not handle safely
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+        in_flight = deque()
+        for start, end in ranges:
+            in_flight.append(pool.submit(_process_chunk, path, start, end, fieldnames, transform))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def load_catalog_parallel(path: str, **kwargs) -> ProductCatalog:
+    """Build a ProductCatalog from `path` using iter_transformed_chunks()."""
+    builder = CatalogBuilder()
+    for records in iter_transformed_chunks(path, normalize_row, **kwargs):
+        for record in records:
+            builder.add(record)
+    return builder.catalog
@@ -0,0 +1,203 @@
+"""
+Catalog generations with background reload.
+
+The manager owns the current ProductCatalog. A reload builds a complete new
+catalog off to the side and then publishes it with a single reference
+assignment, so readers never take a lock: a request grabs `current()` once
+and keeps using that generation until it finishes, even if a newer one is
+swapped in meanwhile.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.services.catalog import ProductCatalog, ProductRecord
+
+# seconds between background warmup attempts after a failed first load
+WARMUP_RETRY_INITIAL = 1.0
+WARMUP_RETRY_MAX = 60.0
+
+
+class CatalogManager:
+    def __init__(self, loader: Callable[[], ProductCatalog], watch_paths: Sequence[str] = (),
+                 prepare: Callable[[ProductCatalog], None] = None):
+        self._loader = loader
+        # builds derived indexes on a new generation before it is published
+        self._prepare = prepare
+        self._watch_paths = tuple(watch_paths)
+        self._current: Optional[ProductCatalog] = None
+        self._generation = 0
+        self._loaded_stamp = None
+        # serializes builders only, never taken on the read path
+        self._build_lock = threading.Lock()
+        self._watcher = None
+
+    def current(self) -> ProductCatalog:
+        catalog = self._current
+        if catalog is not None:
+            return catalog
+        try:
+            return self._load_once()
+        except Exception as e:
+            print(f"Error loading unified products: {e}")
+            return ProductCatalog()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def is_ready(self) -> bool:
+        """True once a catalog generation (with its indexes) has been published."""
+        return self._current is not None
+
+    def _load_once(self) -> ProductCatalog:
+        # double-checked: a burst of first requests waits for a single load
+        with self._build_lock:
+            if self._current is not None:
+                return self._current
+            return self._build_and_swap_locked()
+
+    def warmup(self, background: bool = True):
+        """Load the first generation eagerly instead of on the first request.
+
+        In the background a failed load is retried with exponential backoff
+        until a generation is published (WARMUP_RETRY_INITIAL doubling up to WARMUP_RETRY_MAX seconds).
+        """
+        if not background:
+            self.current()
+            return
+        threading.Thread(target=self._warmup_until_ready, name='catalog-warmup', daemon=True).start()
+
+    def _warmup_until_ready(self):
+        delay = WARMUP_RETRY_INITIAL
+        while True:
+            try:
+                self._load_once()
+                return
+            except Exception as e:
+                print(f"Error loading unified products, retrying in {delay:g}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX)
+
+    def _build_and_swap(self) -> ProductCatalog:
+        with self._build_lock:
+            return self._build_and_swap_locked()
+
+    def _build_and_swap_locked(self) -> ProductCatalog:
+        stamp = self._stamp()
+        return self._swap_locked(self._loader(), stamp)
+
+    def publish(self, build: Callable[[ProductCatalog], ProductCatalog]) -> Optional[ProductCatalog]:
+        """Publish build(current) as the next generation, e.g. the current rows plus a few changes.
+
+        Serialized with reloads, so `build` always sees the latest generation.
+        Returns None (and builds nothing) while no generation is loaded yet.
+        """
+        with self._build_lock:
+            current = self._current
+            if current is None:
+                return None
+            return self._swap_locked(build(current), self._loaded_stamp)
+
+    def _swap_locked(self, catalog: ProductCatalog, stamp) -> ProductCatalog:
+        # numbered before prepare so derived structures can embed the generation
+        catalog.generation = self._generation + 1
+        if self._prepare is not None:
+            self._prepare(catalog)
+        self._generation = catalog.generation
+        self._loaded_stamp = stamp
+        # publish: a plain attribute store is atomic for readers
+        self._current = catalog
+        return catalog
+
+    def reload(self, background: bool = True) -> bool:
+        """Build a new generation and swap it in.
+
+        With background=True the build runs on a daemon thread and this returns
+        immediately. Returns False if a reload is already in progress.
+        """
+        if self._build_lock.locked():
+            return False
+        if not background:
+            self._reload_quietly()
+            return True
+        threading.Thread(target=self._reload_quietly, name='catalog-reload', daemon=True).start()
+        return True
+
+    def _reload_quietly(self):
+        try:
+            catalog = self._build_and_swap()
+            print(f"Catalog generation {catalog.generation} loaded ({len(catalog)} products)")
+        except Exception as e:
+            # keep serving the previous generation
+            print(f"Error reloading catalog: {e}")
+
+    def _stamp(self):
+        stamp = []
+        for path in self._watch_paths:
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def start_watcher(self, interval: float):
+        """Poll the watched files every `interval` seconds and reload when they change."""
+        if self._watcher is not None or interval <= 0 or not self._watch_paths:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                if self._current is not None and self._stamp() != self._loaded_stamp:
+                    self._reload_quietly()
+
+        self._watcher = threading.Thread(target=watch, name='catalog-watcher', daemon=True)
+        self._watcher.start()
+
+
+class PendingChanges:
+    """Product records waiting to be published together as one generation.
+
+    A newer record of a product SKU replaces the queued one. The batch is due
+    once its oldest record has waited `delay` seconds, so a steady trickle of
+    changes rebuilds the indexes at most once per `delay`.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        # product_id -> sku_id -> record
+        self._records: Dict[str, Dict[str, ProductRecord]] = {}
+        self._since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._records
+
+    def add(self, record: ProductRecord):
+        with self._lock:
+            if not self._records:
+                self._since = time.monotonic()
+            self._records.setdefault(record.product_id, {})[record.sku_id] = record
+
+    def due(self) -> List[ProductRecord]:
+        """The queued records if the batch is due, else an empty list."""
+        with self._lock:
+            if not self._records or time.monotonic() - self._since < self.delay:
+                return []
+            return [record for skus in self._records.values() for record in skus.values()]
+
+    def discard(self, records: Sequence[ProductRecord]):
+        """Drop published records, unless a newer record of the SKU was queued meanwhile."""
+        with self._lock:
+            for record in records:
+                skus = self._records.get(record.product_id, {})
+                if skus.get(record.sku_id) is record:
+                    del skus[record.sku_id]
+                    if not skus:
+                        del self._records[record.product_id]
+            if self._records:
+                self._since = time.monotonic()
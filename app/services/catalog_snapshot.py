@@ -0,0 +1,232 @@
+"""
+Precompiled, memory-mapped catalog snapshots.
+
+A snapshot is the ProductCatalog columns written to one binary file:
+fixed-width numeric columns followed by length-prefixed string tables.
+Loading a snapshot only mmaps the file read-only, so startup skips CSV
+parsing and every worker process on a host shares the same page-cache copy.
+
+File layout (little-endian header, columns in native byte order):
+    header      magic, version, byte order, row count, section count,
+                source CSV size and mtime
+    directory   one (name, offset, length) entry per section
+    sections    8-byte aligned; numeric sections are raw arrays, string
+                sections are: u64 count, (count + 1) u64 offsets, utf-8 blob;
+                SKU variants of multi-SKU products are one JSON section
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+from typing import Optional
+
+from app.services.catalog import CATEGORY_LEVELS, ListColumn, ProductCatalog, ProductVariant, StringTable
+
+SNAPSHOT_MAGIC = b'PCATSNAP'
+SNAPSHOT_VERSION = 4
+
+_HEADER = struct.Struct('<8sIBxxxQIxxxxQQ')
+_ENTRY = struct.Struct('<24sQQ')
+_BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+
+NUMERIC_COLUMNS = (
+    ('ratings', 'd'),
+    ('reviews', 'q'),
+    ('loves_counts', 'q'),
+    ('price_min', 'd'),
+    ('price_max', 'd'),
+    ('brand_ids', 'I'),
+) + tuple((f'{level}_ids', 'I') for level in CATEGORY_LEVELS)
+
+STRING_COLUMNS = (
+    'product_ids',
+    'names',
+    'names_lower',
+    'list_prices',
+    'image_urls',
+    'target_urls',
+    'sku_ids',
+)
+
+# list columns are stored as their raw literals and parsed lazily after loading
+LIST_COLUMNS = ('highlights', 'ingredients')
+
+
+class MappedStrings(Sequence):
+    """Read-only string column decoded on access from a mapped string section."""
+
+    def __init__(self, buf: memoryview, offset: int):
+        (count,) = struct.unpack_from('<Q', buf, offset)
+        start = offset + 8
+        end = start + 8 * (count + 1)
+        self._count = count
+        self._offsets = buf[start:end].cast('Q')
+        self._data = buf[end:]
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the section: count, offsets and utf-8 blob."""
+        return 8 * (self._count + 2) + self._offsets[self._count]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('string column index out of range')
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+
+def _numeric_column(catalog: ProductCatalog, name: str):
+    if name.endswith('_ids') and name != 'brand_ids':
+        return catalog.category_ids[name[:-len('_ids')]]
+    return getattr(catalog, name)
+
+
+def _encode_strings(values) -> bytes:
+    blobs = [v.encode('utf-8') for v in values]
+    offsets = [0]
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    return (struct.pack('<Q', len(blobs))
+            + struct.pack(f'={len(offsets)}Q', *offsets)
+            + b''.join(blobs))
+
+
+def _source_stamp(source_path: Optional[str]):
+    if not source_path:
+        return 0, 0
+    st = os.stat(source_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def write_snapshot(catalog: ProductCatalog, path: str, source_path: str = None):
+    """Serialize `catalog` to `path`, atomically replacing any previous snapshot.
+
+    The size and mtime of `source_path` are recorded so a loader can tell when
+    the snapshot no longer matches the CSV it was compiled from.
+    """
+    sections = []
+    for name, typecode in NUMERIC_COLUMNS:
+        column = _numeric_column(catalog, name)
+        if column.typecode != typecode:
+            raise ValueError(f'column {name} has typecode {column.typecode!r}, expected {typecode!r}')
+        sections.append((name, column.tobytes()))
+    for name in STRING_COLUMNS:
+        sections.append((name, _encode_strings(getattr(catalog, name))))
+    for name in LIST_COLUMNS:
+        sections.append((name, _encode_strings(getattr(catalog, name).raw)))
+    # sparse: only multi-SKU products, as JSON {row: [[sku_id, list_price, min, max, image], ...]}
+    sections.append(('variants', json.dumps(
+        {i: [list(v) for v in variants] for i, variants in catalog.multi_variants.items()}).encode('utf-8')))
+    sections.append(('brands', _encode_strings(catalog.brands.values)))
+    for level in CATEGORY_LEVELS:
+        sections.append((f'{level}_table', _encode_strings(catalog.categories[level].values)))
+
+    size, mtime_ns = _source_stamp(source_path)
+    offset = _HEADER.size + _ENTRY.size * len(sections)
+    directory = []
+    for name, data in sections:
+        offset += -offset % 8
+        directory.append((name, offset, len(data)))
+        offset += len(data)
+
+    tmp_path = f'{path}.tmp.{os.getpid()}'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, _BYTE_ORDER,
+                             len(catalog), len(sections), size, mtime_ns))
+        for name, off, length in directory:
+            f.write(_ENTRY.pack(name.encode('ascii'), off, length))
+        for (name, data), (_, off, _) in zip(sections, directory):
+            f.write(b'\0' * (off - f.tell()))
+            f.write(data)
+    # readers that already mapped the old file keep their pages
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str, source_path: str = None) -> Optional[ProductCatalog]:
+    """Map a snapshot read-only and return a ProductCatalog view over it.
+
+    Returns None if the file is missing, was written by another snapshot
+    version or byte order, is stale with respect to `source_path`, or is
+    empty, truncated or otherwise unreadable (callers then parse the CSV).
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        with f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return _map_catalog(mm, source_path)
+    except (OSError, ValueError, TypeError, KeyError, IndexError, struct.error, UnicodeDecodeError) as e:
+        print(f"Ignoring unreadable catalog snapshot {path}: {e!r}")
+        return None
+
+
+def _map_catalog(mm: mmap.mmap, source_path: Optional[str]) -> Optional[ProductCatalog]:
+    buf = memoryview(mm)
+    magic, version, byte_order, rows, count, size, mtime_ns = _HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or byte_order != _BYTE_ORDER:
+        return None
+    if source_path and os.path.exists(source_path) and _source_stamp(source_path) != (size, mtime_ns):
+        return None
+
+    directory = {}
+    for k in range(count):
+        name, off, length = _ENTRY.unpack_from(buf, _HEADER.size + k * _ENTRY.size)
+        name = name.rstrip(b'\0').decode('ascii')
+        if off + length > len(buf):
+            raise ValueError(f'section {name} runs past the end of the file')
+        directory[name] = (off, length)
+
+    catalog = ProductCatalog()
+    for name, typecode in NUMERIC_COLUMNS:
+        off, length = directory[name]
+        column = buf[off:off + length].cast(typecode)
+        if len(column) != rows:
+            raise ValueError(f'column {name} has {len(column)} rows, expected {rows}')
+        if name == 'brand_ids':
+            catalog.brand_ids = column
+        elif name.endswith('_ids'):
+            catalog.category_ids[name[:-len('_ids')]] = column
+        else:
+            setattr(catalog, name, column)
+    for name in STRING_COLUMNS:
+        setattr(catalog, name, _strings(buf, directory[name], rows, name))
+    for name in LIST_COLUMNS:
+        setattr(catalog, name, ListColumn(_strings(buf, directory[name], rows, name)))
+    off, length = directory['variants']
+    catalog.multi_variants = {
+        int(i): [ProductVariant(*v) for v in variants]
+        for i, variants in json.loads(str(buf[off:off + length], 'utf-8')).items()
+    }
+    # interned tables are small, keep them on the heap for dict lookups
+    catalog.brands = StringTable.from_values(_strings(buf, directory['brands']))
+    for level in CATEGORY_LEVELS:
+        catalog.categories[level] = StringTable.from_values(
+            _strings(buf, directory[f'{level}_table']))
+    # the views above keep the mapping alive; hold it explicitly as well
+    catalog.snapshot = mm
+    return catalog
+
+
+def _strings(buf: memoryview, section, rows: int = None, name: str = '') -> 'MappedStrings':
+    """MappedStrings over `section` after checking its offsets table and blob fit inside it."""
+    off, length = section
+    (count,) = struct.unpack_from('<Q', buf, off)
+    if rows is not None and count != rows:
+        raise ValueError(f'column {name} has {count} rows, expected {rows}')
+    if 8 * (count + 2) > length:
+        raise ValueError(f'string section {name or off} is truncated')
+    strings = MappedStrings(buf, off)
+    if strings.nbytes > length:
+        raise ValueError(f'string section {name or off} is truncated')
+    return strings
@@ -0,0 +1,69 @@
+"""
+Category counts and the primary -> secondary -> tertiary tree, per catalog generation.
+
+Both are counted in one pass over the category columns when first needed.
+The tree is serialized to JSON once, together with an ETag, so
+/products/categories/tree only writes out pre-built bytes (or a 304).
+"""
+import hashlib
+import json
+from typing import Dict, List
+
+from app.services.catalog import CATEGORY_LEVELS, ProductCatalog
+
+
+def _nodes(table, counts: Dict[int, int], children=None) -> List[dict]:
+    # most products first; ties keep first-seen (id) order
+    nodes = []
+    for cid, count in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
+        node = {'name': table.values[cid], 'count': count}
+        if children is not None:
+            node['children'] = children(cid)
+        nodes.append(node)
+    return nodes
+
+
+class CategoryTree:
+    KEY = 'category_tree'
+
+    def __init__(self, catalog: ProductCatalog):
+        # products per raw category id, per level (the flat /products/categories lists)
+        self.level_counts: Dict[str, List[int]] = {}
+        for level in CATEGORY_LEVELS:
+            counts = [0] * len(catalog.categories[level])
+            for cid in catalog.category_ids[level]:
+                counts[cid] += 1
+            self.level_counts[level] = counts
+
+        # the tree groups spellings that differ only in case (canonical ids)
+        primary, secondary, tertiary = (catalog.categories[level] for level in CATEGORY_LEVELS)
+        primary_ids, secondary_ids, tertiary_ids = (catalog.category_ids[level] for level in CATEGORY_LEVELS)
+        primary_counts: Dict[int, int] = {}
+        secondary_counts: Dict[int, Dict[int, int]] = {}
+        tertiary_counts: Dict[tuple, Dict[int, int]] = {}
+        for i in range(len(catalog)):
+            p = primary.canonical[primary_ids[i]]
+            if not p:
+                continue
+            primary_counts[p] = primary_counts.get(p, 0) + 1
+            s = secondary.canonical[secondary_ids[i]]
+            if not s:
+                continue
+            bucket = secondary_counts.setdefault(p, {})
+            bucket[s] = bucket.get(s, 0) + 1
+            t = tertiary.canonical[tertiary_ids[i]]
+            if t:
+                bucket = tertiary_counts.setdefault((p, s), {})
+                bucket[t] = bucket.get(t, 0) + 1
+
+        self.tree = _nodes(primary, primary_counts, lambda p: _nodes(
+            secondary, secondary_counts.get(p, {}), lambda s: _nodes(
+                tertiary, tertiary_counts.get((p, s), {}))))
+        self.body = json.dumps({'generation': catalog.generation, 'categories': self.tree},
+                               ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # generation plus a digest: generation numbers restart with the process, the digest does not
+        self.etag = f'g{catalog.generation}-{hashlib.sha1(self.body).hexdigest()[:16]}'
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'CategoryTree':
+        return catalog.derived(cls.KEY, cls)
@@ -0,0 +1,100 @@
+"""
+Pre-rendered JSON fragments of product list items.
+
+Each product's list item (ranking, search, similar) is serialized once per
+catalog generation, split around its one per-request field (score or
+similarity), so a response is assembled by concatenating bytes instead of
+building and encoding a dict per item. Output matches the app's jsonify
+(flask_pymongo's bson.json_util provider): keys in insertion order, default
+separators, ASCII-escaped.
+"""
+import json
+import threading
+from typing import Callable, Dict, List, Tuple
+
+
+class RawJSON(bytes):
+    """Already serialized JSON, spliced verbatim by dumps()."""
+
+
+def _encode(value) -> bytes:
+    return json.dumps(value).encode('ascii')
+
+
+def dumps(obj) -> bytes:
+    """Serialize like jsonify does, passing RawJSON values through."""
+    if isinstance(obj, RawJSON):
+        return obj
+    if isinstance(obj, dict):
+        return b'{' + b', '.join(_encode(str(k)) + b': ' + dumps(v) for k, v in obj.items()) + b'}'
+    if isinstance(obj, (list, tuple)):
+        return b'[' + b', '.join(dumps(v) for v in obj) + b']'
+    return _encode(obj)
+
+
+def json_response(payload, status: int = 200):
+    """Flask response of dumps(payload)."""
+    from flask import current_app
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+class FragmentShape:
+    """How to render one kind of list item.
+
+    `render(catalog, i, value)` returns the item dict; `field` is the key
+    holding the per-request value, rounded to `digits`.
+    """
+
+    def __init__(self, render: Callable, field: str, digits: int):
+        self.render = render
+        self.field = field
+        self.digits = digits
+
+    def split(self, catalog, i: int) -> Tuple[bytes, bytes]:
+        item = self.render(catalog, i, 0.0)
+        parts = [(k, _encode(k) + b': ' + _encode(v)) for k, v in item.items()]
+        at = [k for k, _ in parts].index(self.field)
+        before = [p for _, p in parts[:at]]
+        after = [p for _, p in parts[at + 1:]]
+        head = b'{' + b''.join(p + b', ' for p in before) + _encode(self.field) + b': '
+        tail = b''.join(b', ' + p for p in after) + b'}'
+        return head, tail
+
+
+class ProductFragments:
+    """(head, tail) bytes of every product for every shape, for one catalog generation."""
+
+    KEY = 'product_fragments'
+
+    def __init__(self, catalog, shapes: Dict[str, FragmentShape]):
+        self._catalog = catalog
+        self._shapes = shapes
+        self._lock = threading.Lock()
+        self._parts: Dict[str, List[Tuple[bytes, bytes]]] = {
+            name: [shape.split(catalog, i) for i in range(len(catalog))]
+            for name, shape in shapes.items()
+        }
+
+    @classmethod
+    def for_catalog(cls, catalog, shapes: Dict[str, FragmentShape]) -> 'ProductFragments':
+        return catalog.derived(cls.KEY, lambda c: cls(c, shapes))
+
+    def item(self, shape: str, i: int, value: float) -> RawJSON:
+        parts = self._parts[shape]
+        if i >= len(parts):
+            # appended after this generation's fragments were rendered
+            self._extend()
+        head, tail = parts[i]
+        return RawJSON(head + _encode(round(value, self._shapes[shape].digits)) + tail)
+
+    def refresh(self, i: int):
+        """Re-render row i after its columns changed in place."""
+        for name, shape in self._shapes.items():
+            if i < len(self._parts[name]):
+                self._parts[name][i] = shape.split(self._catalog, i)
+
+    def _extend(self):
+        with self._lock:
+            for name, shape in self._shapes.items():
+                parts = self._parts[name]
+                parts.extend(shape.split(self._catalog, i) for i in range(len(parts), len(self._catalog)))
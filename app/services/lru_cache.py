@@ -0,0 +1,51 @@
+"""
+Bounded least-recently-used cache behind the per-generation caches
+(OrderingCache for paginated orderings, ResultCache for response bodies).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LRUCache:
+    """At most `maxsize` values built on a miss, each valid for `ttl` seconds (forever if None)."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expiry or None, value)
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _record(self, hit: bool):
+        """Called on every lookup; subclasses count hits and misses here."""
+
+    def get(self, key: tuple, build: Callable[[], object]):
+        """Return the value stored under `key`, building it on a miss (None results are not stored)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end(key)
+                self._record(True)
+                return entry[1]
+        self._record(False)
+        # build outside the lock; two concurrent misses just do the work twice
+        value = build()
+        if value is None or self.maxsize <= 0:
+            return value
+        expiry = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,131 @@
+"""
+ProductCatalog source backed by the MongoDB `products` collection.
+
+The catalog is bulk-loaded once from db.products. After that, sync() pulls
+only the documents whose `last_updated` is recent (Sephora refreshes written
+by get_product_detail_cached) and hands them to a callback, which patches or
+republishes them (see ProductService._apply_catalog_changes); the published
+catalog is never resized in place.
+
+Writers stamp `last_updated` from their own clock before the write lands, so
+a document can show up after one with a newer stamp. Every sync therefore
+re-reads the last `overlap` seconds before the newest stamp seen; the
+callback skips records that change nothing.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from app.services.catalog import CatalogBuilder, ProductCatalog, ProductRecord, normalize_row
+
+# fields normalize_row() reads; everything else (images, skus, descriptions) stays in MongoDB
+CATALOG_PROJECTION = {
+    '_id': 0,
+    'product_id': 1,
+    'product_name': 1,
+    'brand_name': 1,
+    'rating': 1,
+    'reviews': 1,
+    'loves_count': 1,
+    'listPrice': 1,
+    'price': 1,
+    'image_url': 1,
+    'target_url': 1,
+    'skuId': 1,
+    'primary_category': 1,
+    'secondary_category': 1,
+    'tertiary_category': 1,
+    'highlights': 1,
+    'ingredients': 1,
+    'last_updated': 1,
+}
+
+# seconds re-read before the newest `last_updated` seen, longer than any writer takes to commit
+SYNC_OVERLAP = 60.0
+
+
+class MongoCatalogSource:
+    def __init__(self, batch_size: int = 1000, overlap: float = SYNC_OVERLAP):
+        self._batch_size = batch_size
+        self._overlap = overlap
+        # newest `last_updated` applied so far (ISO-8601 strings sort chronologically)
+        self._watermark: Optional[str] = None
+        # guards the watermark; never held while changes are applied, since
+        # applying takes the catalog build lock and a reload (holding it) calls load()
+        self._sync_lock = threading.Lock()
+        # one sync at a time
+        self._apply_lock = threading.Lock()
+        self._syncer = None
+
+    @staticmethod
+    def _collection():
+        from app import mongoDb
+        return mongoDb.db.products
+
+    def _advance(self, doc):
+        stamp = doc.get('last_updated')
+        if isinstance(stamp, str) and (self._watermark is None or stamp > self._watermark):
+            self._watermark = stamp
+
+    def _since(self, watermark: str) -> str:
+        try:
+            start = datetime.fromisoformat(watermark) - timedelta(seconds=self._overlap)
+        except ValueError:
+            return watermark
+        return start.isoformat()
+
+    def load(self) -> ProductCatalog:
+        """Bulk-load every product document into a new catalog."""
+        with self._sync_lock:
+            builder = CatalogBuilder()
+            watermark = self._watermark
+            self._watermark = None
+            try:
+                cursor = self._collection().find({}, CATALOG_PROJECTION, batch_size=self._batch_size)
+                for doc in cursor:
+                    builder.add(normalize_row(doc))
+                    self._advance(doc)
+            except Exception:
+                self._watermark = watermark
+                raise
+            return builder.catalog
+
+    def sync(self, apply: Callable[[List[ProductRecord]], None]) -> int:
+        """Pass the documents changed since the last sync, oldest first, to apply(records).
+
+        Documents within the overlap window are passed again, so apply() must
+        be idempotent. It is called on every sync, with no records when
+        nothing changed, so it can publish work it batched earlier. The
+        watermark only advances once apply() returns, so a failed apply is
+        retried by the next sync. Returns the number of documents read.
+        """
+        with self._apply_lock:
+            with self._sync_lock:
+                watermark = self._watermark
+            if watermark:
+                query = {'last_updated': {'$gte': self._since(watermark)}}
+            else:
+                query = {'last_updated': {'$type': 'string'}}
+            docs = list(self._collection().find(query, CATALOG_PROJECTION).sort('last_updated', 1))
+            apply([normalize_row(doc) for doc in docs])
+            with self._sync_lock:
+                for doc in docs:
+                    self._advance(doc)
+            return len(docs)
+
+    def start_sync(self, apply: Callable[[List[ProductRecord]], None], interval: float):
+        """Run sync(apply) every `interval` seconds on a daemon thread."""
+        if self._syncer is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync(apply)
+                except Exception as e:
+                    print(f"Error syncing catalog from MongoDB: {e}")
+
+        self._syncer = threading.Thread(target=run, name='catalog-mongo-sync', daemon=True)
+        self._syncer.start()
@@ -0,0 +1,131 @@
+"""
+Ranking served by MongoDB instead of the in-memory RankingIndex.
+
+Every products document carries a precomputed numeric `score` (the 'ranking'
+weight set of ScoringEngine), a `score_weights` hash of the weights it was
+computed with and lowercase `<level>_category_key` fields.
+Compound indexes on (category key, score desc, product_id) and
+(score desc, product_id) answer a ranking page with an index-covered query
+returning only (product_id, score); the page's display fields are then
+fetched with one `$in` query on the unique product_id index.
+
+Pages are walked by keyset (last score and product_id) rather than skip, so
+each page costs the same however deep it is.
+"""
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+from app.services.catalog import CATEGORY_LEVELS, ProductRecord, normalize_row
+from app.services.mongo_catalog import CATALOG_PROJECTION
+from app.services.scoring import ScoringEngine
+
+
+def category_key_field(level: str) -> str:
+    return f'{level}_category_key'
+
+
+def _number(field: str) -> dict:
+    # CSV imports keep some numeric fields as strings
+    return {'$convert': {'input': f'${field}', 'to': 'double', 'onError': 0, 'onNull': 0}}
+
+
+SCORE_WEIGHTS_FIELD = 'score_weights'
+
+
+def weights_hash(engine: ScoringEngine = None) -> str:
+    """Short digest of a weight set, stored with each score to spot stale ones."""
+    w = (engine or ScoringEngine.named('ranking')).weights
+    return hashlib.sha1(json.dumps(w, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def score_stage(engine: ScoringEngine = None) -> dict:
+    """Aggregation `$set` stage computing `score`, its weights hash and the category keys of a document."""
+    engine = engine or ScoringEngine.named('ranking')
+    w = engine.weights
+    terms = [{'$multiply': [_number('rating'), w['rating_weight']]}]
+    if w['review_divisor'] and w['review_cap']:
+        terms.append({'$min': [{'$divide': [_number('reviews'), w['review_divisor']]}, w['review_cap']]})
+    if w['loves_divisor'] and w['loves_cap']:
+        terms.append({'$min': [{'$divide': [_number('loves_count'), w['loves_divisor']]}, w['loves_cap']]})
+    fields = {'score': {'$add': terms}, SCORE_WEIGHTS_FIELD: weights_hash(engine)}
+    for level in CATEGORY_LEVELS:
+        fields[category_key_field(level)] = {
+            '$toLower': {'$trim': {'input': {'$ifNull': [f'${level}_category', '']}}}}
+    return {'$set': fields}
+
+
+class MongoRankingBackend:
+    @staticmethod
+    def _collection():
+        from app import mongoDb
+        return mongoDb.db.products
+
+    @staticmethod
+    def ensure_indexes(collection=None):
+        from pymongo import ASCENDING, DESCENDING
+
+        collection = collection if collection is not None else MongoRankingBackend._collection()
+        collection.create_index([('score', DESCENDING), ('product_id', ASCENDING)])
+        for level in CATEGORY_LEVELS:
+            collection.create_index([(category_key_field(level), ASCENDING),
+                                     ('score', DESCENDING), ('product_id', ASCENDING)])
+
+    @staticmethod
+    def stale_filter(engine: ScoringEngine = None) -> dict:
+        """Documents without a score computed with the current weights."""
+        return {SCORE_WEIGHTS_FIELD: {'$ne': weights_hash(engine)}}
+
+    @staticmethod
+    def backfill_scores(collection=None, engine: ScoringEngine = None) -> int:
+        """(Re)compute `score` and the category keys server-side, where they are stale.
+
+        Only documents never scored or scored with other weights are touched,
+        so run it after every import and whenever the ranking weights may have
+        changed. Returns the number of documents modified.
+        """
+        collection = collection if collection is not None else MongoRankingBackend._collection()
+        return collection.update_many(MongoRankingBackend.stale_filter(engine),
+                                      [score_stage(engine)]).modified_count
+
+    @staticmethod
+    def rescore(product_id: str):
+        """Recompute `score` of one product after its popularity changed."""
+        MongoRankingBackend._collection().update_one({'product_id': product_id}, [score_stage()])
+
+    @staticmethod
+    def top(category: Optional[str], level: str, n: int,
+            after: Optional[Tuple[float, str]] = None) -> List[Tuple[float, ProductRecord]]:
+        """Up to n (score, record) pairs, best first.
+
+        Optionally only products of `category` at `level`, and only those
+        ranked after the (score, product_id) key `after`.
+        """
+        from pymongo import ASCENDING, DESCENDING
+
+        if n <= 0:
+            return []
+        query = {}
+        if category:
+            query[category_key_field(level)] = category.strip().lower()
+        if after is not None:
+            score, product_id = after
+            query['$or'] = [{'score': {'$lt': score}},
+                            {'score': score, 'product_id': {'$gt': product_id}}]
+        collection = MongoRankingBackend._collection()
+        # covered by the (category key, score, product_id) / (score, product_id) indexes
+        keys = list(collection.find(query, {'_id': 0, 'product_id': 1, 'score': 1})
+                    .sort([('score', DESCENDING), ('product_id', ASCENDING)])
+                    .limit(n))
+        if not keys:
+            return []
+
+        docs = {}
+        for doc in collection.find({'product_id': {'$in': [k['product_id'] for k in keys]}}, CATALOG_PROJECTION):
+            docs.setdefault(doc.get('product_id'), doc)
+        out = []
+        for key in keys:
+            doc = docs.get(key['product_id'])
+            if doc is not None:
+                out.append((key['score'], normalize_row(doc)))
+        return out
@@ -0,0 +1,143 @@
+"""
+Opaque cursors for paginated product lists.
+
+A cursor records which ordering it walks (kind and parameters), the catalog
+generation that ordering was computed from and the offset of the next page,
+or, for rankings whose products move while the generation is live, the
+(score, row) key the page ended with.
+Orderings that are expensive to compute (search, similar products) are kept
+per catalog generation in a small LRU, so page N+1 is a slice of a stored
+ordering instead of a fresh scan of the catalog.
+"""
+import base64
+import binascii
+import json
+from array import array
+from bisect import bisect_right
+from typing import Callable, List, Optional, Tuple
+
+from app.services.lru_cache import LRUCache
+
+ORDERING_CACHE_SIZE = 64
+
+
+class CursorError(ValueError):
+    """A cursor that is malformed, belongs to another endpoint or to an older catalog generation."""
+
+
+def _optional(*types):
+    # bool is an int subclass, but never a valid price
+    return lambda v: v is None or (isinstance(v, types) and not isinstance(v, bool))
+
+
+def _score_key(v) -> bool:
+    return (isinstance(v, list) and len(v) == 2 and isinstance(v[0], (int, float))
+            and not isinstance(v[0], bool) and isinstance(v[1], str))
+
+
+def _row_key(v) -> bool:
+    return (isinstance(v, list) and len(v) == 2 and isinstance(v[0], (int, float))
+            and not isinstance(v[0], bool) and isinstance(v[1], int) and not isinstance(v[1], bool))
+
+
+# kind -> param -> check; cursors carrying anything else are rejected
+CURSOR_PARAMS = {
+    'ranking': {'category': _optional(str), 'level': _optional(str), 'segment': _optional(str),
+                'price_min': _optional(int, float), 'price_max': _optional(int, float), 'after': _row_key},
+    'ranking-mongo': {'category': _optional(str), 'level': _optional(str), 'after': _score_key},
+    'search': {'query': _optional(str), 'mode': _optional(str),
+               'price_min': _optional(int, float), 'price_max': _optional(int, float)},
+    'similar': {'product_id': _optional(str)},
+}
+
+
+def encode_cursor(kind: str, params: dict, generation: int, offset: int) -> str:
+    payload = json.dumps({'k': kind, 'p': params, 'g': generation, 'o': offset},
+                         separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, kind: str, generation: int) -> Tuple[dict, int]:
+    """Return (params, offset) of a cursor issued by encode_cursor() for `kind`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        params, offset = payload['p'], int(payload['o'])
+        if payload['k'] != kind or not isinstance(params, dict) or offset < 0:
+            raise ValueError
+        checks = CURSOR_PARAMS[kind]
+        if not all(name in checks and checks[name](value) for name, value in params.items()):
+            raise ValueError
+        stamp = payload['g']
+        if not isinstance(stamp, int) or isinstance(stamp, bool):
+            raise ValueError
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise CursorError('invalid cursor')
+    if stamp != generation:
+        raise CursorError('cursor expired, the catalog was reloaded')
+    return params, offset
+
+
+class ScoredOrder:
+    """A computed ordering stored compactly as parallel score/row arrays.
+
+    Offers the same top(n, offset) / after(score, row, n) / len() interface as RankedList.
+    """
+
+    def __init__(self, pairs: List[Tuple[float, int]]):
+        self.scores = array('d', (score for score, _ in pairs))
+        self.rows = array('q', (i for _, i in pairs))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def top(self, n: int, offset: int = 0) -> List[Tuple[float, int]]:
+        return list(zip(self.scores[offset:offset + n], self.rows[offset:offset + n]))
+
+    def after(self, score: float, row: int, n: int) -> List[Tuple[float, int]]:
+        """Pairs ranked after (score, row); the ordering must be by score, best first, ties by row."""
+        scores, rows = self.scores, self.rows
+        start = bisect_right(range(len(rows)), (-score, row), key=lambda j: (-scores[j], rows[j]))
+        return self.top(n, start)
+
+
+class OrderingCache(LRUCache):
+    """Least-recently-used orderings of one catalog generation."""
+
+    KEY = 'orderings'
+
+    def __init__(self, catalog=None, maxsize: int = ORDERING_CACHE_SIZE):
+        super().__init__(maxsize)
+
+    @classmethod
+    def for_catalog(cls, catalog) -> 'OrderingCache':
+        return catalog.derived(cls.KEY, cls)
+
+    def get(self, key: tuple, compute: Callable[[], List[Tuple[float, int]]]) -> ScoredOrder:
+        """Return the ordering stored under `key`, computing (score, row) pairs on a miss."""
+        return super().get(key, lambda: ScoredOrder(compute()))
+
+
+def page(ordering, kind: str, params: dict, generation: int, offset: int,
+         size: int, keyset: bool = False) -> Tuple[List[Tuple[float, int]], Optional[str]]:
+    """Slice one page of (score, row) pairs off `ordering` and the cursor of the next page.
+
+    With keyset=True the next cursor holds the (score, row) the page ends with
+    (params['after']) instead of its offset, and the page after it starts past
+    that key, so products moving elsewhere in a live ranking do not shift it.
+    """
+    size = max(size, 0)
+    if ordering is None:
+        pairs = []
+    elif keyset and 'after' in params:
+        pairs = ordering.after(*params['after'], size + 1)
+    else:
+        pairs = ordering.top(size + 1, offset)
+    # one pair past the page tells whether there is a next one
+    pairs, more = pairs[:size], len(pairs) > size
+    if not (pairs and more):
+        return pairs, None
+    if keyset:
+        score, row = pairs[-1]
+        return pairs, encode_cursor(kind, dict(params, after=[score, row]), generation, 0)
+    return pairs, encode_cursor(kind, params, generation, offset + len(pairs))
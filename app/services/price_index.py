@@ -0,0 +1,62 @@
+"""
+Sorted price index over the catalog's numeric price_min column.
+
+Rows are ordered by their lowest listed price once per catalog generation;
+a price range query is two bisections and a slice. Products without a
+parsable price (price_min 0) are left out, so they never match a price
+filter. A product whose price changes in place is moved between positions
+instead of re-sorting the whole index.
+"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+import numpy as np
+
+from app.services.catalog import ProductCatalog
+from app.services.scoring import as_array
+
+
+class PriceIndex:
+    KEY = 'price_index'
+
+    def __init__(self, catalog: ProductCatalog):
+        prices = as_array(catalog.price_min, np.float64)
+        known = np.flatnonzero(prices > 0)
+        order = known[np.argsort(prices[known], kind='stable')]
+        self.prices = array('d', prices[order].tolist())
+        self.rows = array('q', order.tolist())
+        # a move deletes from and inserts into both arrays, which readers must not see halfway
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'PriceIndex':
+        return catalog.derived(cls.KEY, cls)
+
+    def rows_between(self, price_min: Optional[float] = None, price_max: Optional[float] = None) -> array:
+        """Rows whose lowest price is within [price_min, price_max] (either bound optional), cheapest first."""
+        with self._lock:
+            lo = 0 if price_min is None else bisect_left(self.prices, price_min)
+            hi = len(self.prices) if price_max is None else bisect_right(self.prices, price_max)
+            return self.rows[lo:max(lo, hi)]
+
+    def move(self, row: int, old_price: float, new_price: float):
+        """Reposition `row` after its lowest price changed from `old_price` to `new_price`.
+
+        Equal prices stay in row order, as the stable sort built them.
+        """
+        with self._lock:
+            if old_price > 0:
+                lo = bisect_left(self.prices, old_price)
+                hi = bisect_right(self.prices, old_price, lo)
+                k = lo + bisect_left(self.rows[lo:hi], row)
+                if k < hi and self.rows[k] == row:
+                    del self.prices[k]
+                    del self.rows[k]
+            if new_price > 0:
+                lo = bisect_left(self.prices, new_price)
+                hi = bisect_right(self.prices, new_price, lo)
+                k = lo + bisect_left(self.rows[lo:hi], row)
+                self.prices.insert(k, new_price)
+                self.rows.insert(k, row)
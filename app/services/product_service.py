@@ -1,59 +1,93 @@
-import csv
-import ast
 import os
+import numpy as np
 from app.utils.apis import get_detail_from_sephora
-DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'dataset', 'products_unified.csv')
+from app.services.catalog import INDEXED_FIELDS, ProductCatalog
+from app.services.catalog_snapshot import load_snapshot
+from app.services.catalog_ingest import DEFAULT_CHUNK_BYTES, load_catalog_parallel
+from app.services.catalog_manager import CatalogManager, PendingChanges
+from app.services.category_tree import CategoryTree
+from app.services.fragments import FragmentShape, ProductFragments
+from app.services.mongo_catalog import SYNC_OVERLAP, MongoCatalogSource
+from app.services.mongo_ranking import MongoRankingBackend
+from app.services.pagination import CursorError, OrderingCache, decode_cursor, encode_cursor, page
+from app.services.price_index import PriceIndex
+from app.services.result_cache import CacheStats, ResultCache
+from app.services.search_index import RESULT_LIMIT, NameIndex, lcs_counter
+from app.services.spelling import SpellingIndex
+from app.services.suggest_index import SUGGEST_TOP_K, SuggestIndex
+from app.services.text_index import BM25Index
+from app.services.ranking_index import SKIN_SEGMENTS, RankingIndex, SegmentRankings
+from app.services.scoring import ScoringEngine, top_k
+from app.services.trending import DEFAULT_TOP_K, EVENT_WEIGHTS, TrendingTracker
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+DATASET_PATH = os.getenv('CATALOG_DATASET_PATH', os.path.join(BASE_DIR, 'dataset', 'products_unified.csv'))
+# compiled by scripts/build_catalog_snapshot.py; dataset/ is mounted read-only in docker
+SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'build', 'products_unified.snapshot'))
+# CSVs at least this large are parsed by a process pool, in chunks of PARALLEL_LOAD_CHUNK_BYTES
+PARALLEL_LOAD_MIN_BYTES = int(os.getenv('CATALOG_PARALLEL_MIN_BYTES', str(64 * 1024 * 1024)))
+PARALLEL_LOAD_CHUNK_BYTES = int(os.getenv('CATALOG_PARALLEL_CHUNK_BYTES', str(DEFAULT_CHUNK_BYTES)))
+# 'csv' (dataset file / snapshot) or 'mongo' (db.products with incremental sync)
+CATALOG_SOURCE = os.getenv('CATALOG_SOURCE', 'csv').lower()
+# synced products that need their indexes rebuilt (new, renamed, recategorized, ...) are
+# published together as one new generation at most this often (seconds)
+CATALOG_REBUILD_INTERVAL = float(os.getenv('CATALOG_REBUILD_INTERVAL', '300'))
+# seconds of MongoDB changes re-read by every sync, in case a write landed after a newer one
+CATALOG_SYNC_OVERLAP = float(os.getenv('CATALOG_SYNC_OVERLAP', str(SYNC_OVERLAP)))
+# 'memory' (RankingIndex per catalog generation) or 'mongo' (indexed `score` in db.products)
+RANKING_BACKEND = os.getenv('RANKING_BACKEND', 'memory').lower()
+# seconds for a trending event's weight to halve
+TRENDING_HALF_LIFE = float(os.getenv('TRENDING_HALF_LIFE', str(6 * 3600)))
+# ready-to-send search/similar responses kept per catalog generation (entries, seconds)
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '300'))
 
-_PRODUCTS = None
-_PRODUCTS_WITH_CATEGORIES = None
+# fields written to db.products by Sephora detail refreshes that the catalog doesn't hold
+BATCH_DETAIL_FIELDS = ('images', 'main_image', 'highlights', 'ingredients', 'short_description',
+                       'long_description', 'skus', 'last_updated')
 
-class ProductService:
-    @staticmethod
-    def _safe_parse_list_field(value):
-        if not value:
-            return []
-        try:
-            parsed = ast.literal_eval(value)
-            if isinstance(parsed, list):
-                return [str(x).strip() for x in parsed]
-        except Exception:
-            # fallback: try to split on common separators
-            v = value.strip()
-            if v.startswith("[") and v.endswith("]"):
-                v = v[1:-1]
-            parts = [p.strip().strip("'\"") for p in v.split(",") if p.strip()]
-            return parts
-        return []
-
-    @staticmethod
-    def load_products(csv_path=None):
-        global _PRODUCTS
-        if _PRODUCTS is not None:
-            return _PRODUCTS
-        path = csv_path or DATASET_PATH
-        products = []
-        try:
-            with open(path, newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # normalize some fields
-                    row['rating'] = float(row.get('rating') or 0)
-                    row['loves_count'] = int(row.get('loves_count') or 0)
-                    row['highlights_parsed'] = _safe_parse_list_field(row.get('highlights', ''))
-                    row['ingredients_parsed'] = _safe_parse_list_field(row.get('ingredients', ''))
-                    row['primary_category'] = row.get('primary_category') or ''
-                    # try to parse price fields if present
-                    try:
-                        row['price_usd'] = float(row.get('price_usd')) if row.get('price_usd') else None
-                    except Exception:
-                        row['price_usd'] = None
-                    products.append(row)
-        except FileNotFoundError:
-            _PRODUCTS = []
-            return _PRODUCTS
-        _PRODUCTS = products
-        return _PRODUCTS
+_MONGO_SOURCE = MongoCatalogSource(overlap=CATALOG_SYNC_OVERLAP) if CATALOG_SOURCE == 'mongo' else None
+_PENDING_CHANGES = PendingChanges(CATALOG_REBUILD_INTERVAL)
+_TRENDING = TrendingTracker(half_life=TRENDING_HALF_LIFE)
+_RESULT_CACHE_STATS = CacheStats()
+
+
+def _load_catalog():
+    if _MONGO_SOURCE is not None:
+        return _MONGO_SOURCE.load()
+    # prefer the precompiled snapshot when it matches the CSV
+    catalog = load_snapshot(SNAPSHOT_PATH, source_path=DATASET_PATH)
+    if catalog is None:
+        if os.path.getsize(DATASET_PATH) >= PARALLEL_LOAD_MIN_BYTES:
+            catalog = load_catalog_parallel(DATASET_PATH, chunk_bytes=PARALLEL_LOAD_CHUNK_BYTES)
+        else:
+            catalog = ProductCatalog.from_csv(DATASET_PATH)
+    return catalog
 
+
+def _prepare_catalog(catalog):
+    # build per-generation indexes before the catalog is published
+    if RANKING_BACKEND != 'mongo':
+        RankingIndex.for_catalog(catalog)
+    CategoryTree.for_catalog(catalog)
+    NameIndex.for_catalog(catalog)
+    SuggestIndex.for_catalog(catalog)
+    BM25Index.for_catalog(catalog)
+    SpellingIndex.for_catalog(catalog)
+    ProductService._fragments(catalog)
+
+
+_CATALOG_MANAGER = CatalogManager(
+    _load_catalog,
+    prepare=_prepare_catalog,
+    watch_paths=() if _MONGO_SOURCE is not None else (DATASET_PATH, SNAPSHOT_PATH),
+)
+
+
+class UnsupportedFilterError(ValueError):
+    """A list filter the configured backend cannot apply (rather than silently ignore)."""
+
+
+class ProductService:
     @staticmethod
     def _build_keywords(skin_info):
         # Accepts skin_info like {'skin_type':'dry', 'concerns':['acne','sensitivity']}
@@ -74,168 +108,221 @@ class ProductService:
         return list(dict.fromkeys([k for k in keywords if k]))
 
     @staticmethod
-    def recommend_products(skin_info: dict, top_n: int = 10, csv_path: str = None):
+    def _keyword_score(keywords, highlights: str, name: str, category: str, ingredients: list):
+        """Relevance of one product to skin keywords (all text lowercase)."""
+        score = 0.0
+        for kw in keywords:
+            # strong match when highlights explicitly mark Good for
+            if f'good for: {kw}' in highlights:
+                score += 25
+            if kw in highlights:
+                score += 15
+            if kw in name or kw in category:
+                score += 7
+            # ingredients match is supportive signal
+            if any(kw in ing for ing in ingredients):
+                score += 3
+        return score
+
+    @staticmethod
+    def _segment_relevance(catalog, segment: str):
+        """_keyword_score() of every product for one skin-type segment."""
+        keywords = ProductService._build_keywords({'skin_type': segment})
+        primary_lower = catalog.categories['primary'].lower
+        primary_ids = catalog.category_ids['primary']
+        # peek() so scoring every row does not cache every parsed list for the generation
+        highlights, ingredients = catalog.highlights, catalog.ingredients
+        relevance = []
+        for i in range(len(catalog)):
+            relevance.append(ProductService._keyword_score(
+                keywords,
+                ' '.join(highlights.peek(i)).lower(),
+                catalog.names_lower[i],
+                primary_lower[primary_ids[i]],
+                [ing.lower() for ing in ingredients.peek(i)]))
+        return relevance
+
+    @staticmethod
+    def recommend_products(skin_info: dict, top_n: int = 10):
         """Return a list of product dicts best matching the provided skin_info.
 
         skin_info example: {'skin_type':'dry', 'concerns':['acne','sensitivity']}
         """
-        products = load_products(csv_path)
-        if not products:
+        catalog = ProductService.get_catalog()
+        if not len(catalog):
             return []
 
         # extended scoring: consider highlights, ingredients, name and category
-        keywords = _build_keywords(skin_info)
+        keywords = ProductService._build_keywords(skin_info)
         avoid_ingredients = [i.lower() for i in (skin_info.get('avoid_ingredients') or [])]
         price_min = skin_info.get('price_min')
         price_max = skin_info.get('price_max')
+        preferred_category = (skin_info.get('primary_category') or '').lower()
+        primary_lower = catalog.categories['primary'].lower
+        primary_ids = catalog.category_ids['primary']
+        # popularity and rating bumps for every product at once
+        popularity = ScoringEngine.named('recommend').score_catalog(catalog).tolist()
 
         results = []
-        for p in products:
-            # price filtering
-            p_price = p.get('price_usd')
-            if p_price is not None:
+        for i in range(len(catalog)):
+            # price filtering (lower bound of the listed price, 0 when unknown)
+            p_price = catalog.price_min[i]
+            if p_price:
                 if price_min is not None and p_price < price_min:
                     continue
                 if price_max is not None and p_price > price_max:
                     continue
 
-            ing_list = [i.lower() for i in (p.get('ingredients_parsed') or [])]
+            ing_list = [ing.lower() for ing in catalog.ingredients[i]]
             # skip if contains avoided ingredients
             if avoid_ingredients:
                 if any(ai in ing for ai in avoid_ingredients for ing in ing_list):
                     continue
 
-            score = 0.0
-            hl = ' '.join(p.get('highlights_parsed') or []).lower()
-            name = (p.get('product_name') or '').lower()
-            cat = (p.get('primary_category') or '').lower()
-
-            for kw in keywords:
-                # strong match when highlights explicitly mark Good for
-                if f'good for: {kw}' in hl:
-                    score += 25
-                if kw in hl:
-                    score += 15
-                if kw in name or kw in cat:
-                    score += 7
-                # ingredients match is supportive signal
-                if any(kw in ing for ing in ing_list):
-                    score += 3
+            hl = ' '.join(catalog.highlights[i]).lower()
+            cat = primary_lower[primary_ids[i]]
+            score = ProductService._keyword_score(keywords, hl, catalog.names_lower[i], cat, ing_list)
 
             # small category boost
-            preferred_category = (skin_info.get('primary_category') or '').lower()
             if preferred_category and preferred_category in cat:
                 score += 8
 
-            # popularity and rating bumps
-            try:
-                rating = float(p.get('rating') or 0)
-            except Exception:
-                rating = 0.0
-            loves = int(p.get('loves_count') or 0)
-            score += rating * 2.0
-            score += min(loves / 200.0, 8.0)
+            score += popularity[i]
 
             if score > 0:
-                results.append((score, p))
+                results.append((score, i))
 
         # sort by score descending then loves_count then rating
-        results.sort(key=lambda x: (x[0], x[1].get('loves_count', 0), x[1].get('rating', 0)), reverse=True)
+        results.sort(key=lambda x: (x[0], catalog.loves_counts[x[1]], catalog.ratings[x[1]]), reverse=True)
 
         out = []
-        for score, p in results[:top_n]:
+        for score, i in results[:top_n]:
             out.append({
-                'product_id': p.get('product_id'),
-                'product_name': p.get('product_name'),
-                'brand_name': p.get('brand_name'),
-                'rating': p.get('rating'),
-                'loves_count': p.get('loves_count'),
-                'primary_category': p.get('primary_category'),
-                'highlights': p.get('highlights_parsed'),
-                'ingredients': p.get('ingredients_parsed'),
-                'price_usd': p.get('price_usd'),
+                'product_id': catalog.product_ids[i],
+                'product_name': catalog.names[i],
+                'brand_name': catalog.brand_name(i),
+                'rating': catalog.ratings[i],
+                'loves_count': catalog.loves_counts[i],
+                'primary_category': catalog.category('primary', i),
+                'highlights': catalog.highlights[i],
+                'ingredients': catalog.ingredients[i],
+                'price_usd': catalog.price_min[i] or None,
                 'score': round(score, 2)
             })
 
         return out
 
     @staticmethod
-    def get_global_ranking(top_n: int = 20, csv_path: str = None):
+    def get_global_ranking(top_n: int = 20):
         """
         Return top N products across all users by a simple popularity+rating score.
         ---
         200:
         top_n: number of products to return
-        csv_path: optional path to product_info.csv
         Returns: list of product dicts
         
         
         """
-        # Use load_products_with_categories to get products with category info
-        products = ProductService.load_products_with_categories()
+        return ProductService.get_ranking_page(page_size=top_n)[0]
+
+    @staticmethod
+    def _get_ranking_page_mongo(category: str, level: str, page_size: int, cursor: str):
+        """get_ranking_page() answered from db.products (RANKING_BACKEND=mongo).
         
-        if not products:
-            return []
+        Cursors hold the (score, product_id) of the last product of the page.
+        """
+        params = {'category': category, 'level': level}
+        after = None
+        if cursor:
+            # not tied to a catalog generation: the key stays valid across reloads
+            params, _ = decode_cursor(cursor, 'ranking-mongo', 0)
+            after = params.get('after')
+            if after is None:
+                raise CursorError('invalid cursor')
+        category, level = params.get('category'), params.get('level')
+        if level not in ('primary', 'secondary', 'tertiary'):
+            level = 'primary'
+        
+        try:
+            ranked = MongoRankingBackend.top(category, level, page_size, after=after)
+        except Exception as e:
+            print(f"Error querying ranking from MongoDB: {e}")
+            return [], None
+        
+        out = [ProductService._record_ranking_item(record, score) for score, record in ranked]
+        next_cursor = None
+        if ranked and len(ranked) == page_size:
+            score, record = ranked[-1]
+            next_cursor = encode_cursor('ranking-mongo', {'category': category, 'level': level,
+                                                          'after': [score, record.product_id]}, 0, 0)
+        return out, next_cursor
 
-        scored = []
-        for p in products:
-            try:
-                rating = float(p.get('rating') or 0)
-            except Exception:
-                rating = 0.0
-            # use 'reviews' if present (product_item.csv), otherwise fall back to loves_count
-            if p.get('reviews') is not None:
-                pop = int(p.get('reviews') or 0)
-            else:
-                pop = int(p.get('loves_count') or 0)
-            # Simple score: rating weighted + popularity with diminishing returns
-            score = rating * 3.0 + min(pop / 100.0, 20.0)
-            scored.append((score, p))
+    @staticmethod
+    def _record_ranking_item(record, score: float):
+        """_ranking_item() for a ProductRecord read from MongoDB."""
+        return {
+            'product_id': record.product_id,
+            'product_name': record.product_name,
+            'brand_name': record.brand_name,
+            'rating': record.rating,
+            'reviews': record.reviews,
+            'primary_category': record.primary_category,
+            'secondary_category': record.secondary_category,
+            'tertiary_category': record.tertiary_category,
+            'price_usd': record.list_price,
+            'image_url': record.image_url,
+            'target_url': record.target_url,
+            'skuId': record.sku_id,
+            'variants': [{'skuId': record.sku_id, 'price': record.list_price, 'image_url': record.image_url}],
+            'score': round(score, 2)
+        }
 
-        scored.sort(key=lambda x: x[0], reverse=True)
-        out = []
-        seen_ids = set()
-        for score, p in scored:
-            pid = p.get('product_id')
-            if pid in seen_ids:
-                continue
-            seen_ids.add(pid)
-            out.append({
-                'product_id': pid,
-                'product_name': p.get('product_name'),
-                'brand_name': p.get('brand_name'),
-                'rating': p.get('rating'),
-                # include reviews count when available
-                'reviews': p.get('reviews') if p.get('reviews') is not None else p.get('loves_count'),
-                'primary_category': p.get('primary_category'),
-                'secondary_category': p.get('secondary_category'),
-                'tertiary_category': p.get('tertiary_category'),
-                'price_usd': p.get('price_usd') or p.get('listPrice'),
-                'image_url': p.get('image_url'),
-                'target_url': p.get('target_url'),
-                'skuId': p.get('skuId'),
-                'score': round(score, 2)
-            })
-            if len(out) >= top_n:
-                break
-        return out
+    @staticmethod
+    def _ranking_item(catalog, i: int, score: float):
+        return {
+            'product_id': catalog.product_ids[i],
+            'product_name': catalog.names[i],
+            'brand_name': catalog.brand_name(i),
+            'rating': catalog.ratings[i],
+            'reviews': catalog.reviews[i],
+            'primary_category': catalog.category('primary', i),
+            'secondary_category': catalog.category('secondary', i),
+            'tertiary_category': catalog.category('tertiary', i),
+            'price_usd': catalog.list_prices[i],
+            'image_url': catalog.image_urls[i],
+            'target_url': catalog.target_urls[i],
+            'skuId': catalog.sku_ids[i],
+            'variants': ProductService._variants_payload(catalog, i),
+            'score': round(score, 2)
+        }
+
+    @staticmethod
+    def _variants_payload(catalog, i: int):
+        return [
+            {'skuId': v.sku_id, 'price': v.list_price, 'image_url': v.image_url}
+            for v in catalog.variants(i)
+        ]
 
     @staticmethod
     def score_products_and_rank(products: list, top_n: int = 20):
         """Score an external list of product dicts and return top_n in same shape as get_global_ranking."""
-        scored = []
+        ratings = []
+        loves = []
         for p in products:
             try:
-                rating = float(p.get('rating') or 0)
+                ratings.append(float(p.get('rating') or 0))
+            except Exception:
+                ratings.append(0.0)
+            try:
+                loves.append(int(p.get('loves_count') or 0))
             except Exception:
-                rating = 0.0
-            loves = int(p.get('loves_count') or 0) if p.get('loves_count') is not None else 0
-            score = rating * 3.0 + min(loves / 100.0, 20.0)
-            scored.append((score, p))
+                loves.append(0)
 
-        scored.sort(key=lambda x: x[0], reverse=True)
+        scores = ScoringEngine.named('external').score(ratings, loves=loves)
         out = []
-        for score, p in scored[:top_n]:
+        for idx in top_k(scores, top_n).tolist():
+            p = products[idx]
+            score = float(scores[idx])
             out.append({
                 'product_id': p.get('product_id'),
                 'product_name': p.get('product_name'),
@@ -423,39 +510,251 @@ class ProductService:
         return out
 
     @staticmethod
-    def load_products_with_categories():
-        """Load products from unified CSV file with all data (item info + categories).
+    def get_catalog():
+        """Return the current generation of the columnar ProductCatalog.
         
-        Returns list of products with image_url, target_url, reviews, and category fields.
-        Cached globally for performance.
+        The catalog holds image_url, target_url, reviews, price and category columns.
+        A precompiled snapshot is memory-mapped when it matches the CSV, otherwise
+        the CSV is parsed. Callers should fetch it once per request so the whole
+        request sees a single generation even if a reload swaps in a new one.
         """
-        global _PRODUCTS_WITH_CATEGORIES
-        if _PRODUCTS_WITH_CATEGORIES is not None:
-            return _PRODUCTS_WITH_CATEGORIES
+        return _CATALOG_MANAGER.current()
+
+    @staticmethod
+    def reload_catalog(background: bool = True):
+        """Rebuild the catalog from the dataset and atomically swap it in."""
+        return _CATALOG_MANAGER.reload(background=background)
+
+    @staticmethod
+    def start_catalog_watcher(interval: float):
+        """Reload the catalog whenever the dataset CSV or snapshot changes on disk."""
+        _CATALOG_MANAGER.start_watcher(interval)
+
+    @staticmethod
+    def start_catalog_sync(interval: float):
+        """Periodically patch the catalog with products changed in MongoDB (mongo source only)."""
+        if _MONGO_SOURCE is not None:
+            _MONGO_SOURCE.start_sync(ProductService._apply_catalog_changes, interval)
+
+    @staticmethod
+    def sync_catalog():
+        """Pull products changed in MongoDB since the last sync into the catalog."""
+        if _MONGO_SOURCE is None:
+            return 0
+        return _MONGO_SOURCE.sync(ProductService._apply_catalog_changes)
+
+    @staticmethod
+    def _apply_catalog_changes(records):
+        """Apply synced product records without resizing or re-keying the published catalog.
         
-        # Load unified products file
-        products = []
-        try:
-            with open(DATASET_PATH, newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Normalize fields
-                    try:
-                        row['rating'] = float(row.get('rating') or 0)
-                    except Exception:
-                        row['rating'] = 0.0
-                    try:
-                        row['reviews'] = int(row.get('reviews') or 0)
-                    except Exception:
-                        row['reviews'] = 0
-                    
-                    products.append(row)
-        except Exception as e:
-            print(f"Error loading unified products: {e}")
+        A record is compared with its row as the catalog uses it (parsed lists,
+        prices folded into the SKU variants), so records that change nothing are
+        skipped. Popularity, price, URL and SKU changes are patched into the
+        row in place (see _patch_product). New products and changes to indexed
+        fields (name, brand, categories, highlights, ingredients) are queued
+        and published as one new generation, with all indexes prepared before
+        the swap, at most every CATALOG_REBUILD_INTERVAL seconds.
+        """
+        catalog = _CATALOG_MANAGER.current()
+        patched = 0
+        for record in records:
+            i = catalog.index_of(record.product_id)
+            changed = catalog.changed_fields(i, record) if i >= 0 else INDEXED_FIELDS
+            if changed - INDEXED_FIELDS:
+                # the other fields go live now, even if the indexed ones wait for the next generation
+                row = catalog.record(i)
+                ProductService._patch_product(catalog, i, record._replace(
+                    **{field: getattr(row, field) for field in INDEXED_FIELDS}), changed - INDEXED_FIELDS)
+                patched += 1
+            # a queued record of the product is outdated by this one, whatever it changes
+            if changed & INDEXED_FIELDS or record.product_id in _PENDING_CHANGES:
+                _PENDING_CHANGES.add(record)
+        if patched:
+            OrderingCache.for_catalog(catalog).clear()
+            ProductService._result_cache(catalog).clear()
+        
+        pending = _PENDING_CHANGES.due()
+        if pending:
+            published = _CATALOG_MANAGER.publish(lambda current: current.with_changes(pending))
+            if published is not None:
+                _PENDING_CHANGES.discard(pending)
+                print(f"Catalog generation {published.generation} published ({len(pending)} products changed)")
+
+    @staticmethod
+    def _patch_product(catalog, i: int, record, changed):
+        """Overwrite row i of the published catalog with a record whose indexed fields are unchanged.
+        
+        The price index, pre-rendered fragments and (for popularity changes)
+        the rankings are updated for this row only; callers clear the
+        ordering and result caches once per batch.
+        """
+        prices = PriceIndex.for_catalog(catalog)
+        old_price = catalog.price_min[i]
+        catalog.update(i, record)
+        if catalog.price_min[i] != old_price:
+            prices.move(i, old_price, catalog.price_min[i])
+        ProductService._fragments(catalog).refresh(i)
+        if changed & {'rating', 'reviews', 'loves_count'}:
+            ProductService._rescore(catalog, i)
+
+    @staticmethod
+    def _rescore(catalog, i: int):
+        """Reposition row i in the precomputed rankings after its popularity changed."""
+        if RANKING_BACKEND != 'mongo':
+            RankingIndex.for_catalog(catalog).rescore(catalog, i)
+            for index in SegmentRankings.for_catalog(catalog).built():
+                index.rescore(catalog, i)
+
+    @staticmethod
+    def warmup_catalog(background: bool = True):
+        """Load the catalog ahead of the first request (see /readyz)."""
+        _CATALOG_MANAGER.warmup(background=background)
+
+    @staticmethod
+    def catalog_status():
+        """Readiness info for the current catalog generation."""
+        ready = _CATALOG_MANAGER.is_ready
+        return {
+            'ready': ready,
+            'generation': _CATALOG_MANAGER.generation,
+            'products': len(_CATALOG_MANAGER.current()) if ready else 0,
+            'source': CATALOG_SOURCE,
+        }
+
+    @staticmethod
+    def catalog_generation():
+        return _CATALOG_MANAGER.generation
+
+    @staticmethod
+    def record_events(events: list):
+        """Buffer user interaction events for the trending ranking.
+        
+        Args:
+            events: dicts with product_id and type ('view', 'search_click', 'favorite')
+        
+        Returns:
+            (accepted count, rejected count); unknown products and event types are rejected
+        """
+        catalog = ProductService.get_catalog()
+        accepted = 0
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+            pid = event.get('product_id')
+            event_type = event.get('type')
+            if event_type not in EVENT_WEIGHTS or not isinstance(pid, str):
+                continue
+            if catalog.index_of(pid) < 0:
+                continue
+            _TRENDING.record(pid, event_type)
+            accepted += 1
+        return accepted, len(events) - accepted
+
+    @staticmethod
+    def start_trending(refresh_interval: float, flush_interval: float):
+        """Refresh the trending top-K and flush buffered events to MongoDB periodically."""
+        _TRENDING.start(refresh_interval, flush_interval)
+
+    @staticmethod
+    def flush_trending_events():
+        """Write buffered event counts to db.product_stats now."""
+        return _TRENDING.flush()
+
+    @staticmethod
+    def get_trending_ranking(category: str = None, level: str = 'primary', top_n: int = 20, raw: bool = False,
+                             price_min: float = None, price_max: float = None):
+        """Get the most trending products from the last top-K refresh.
+        
+        Args:
+            category: Category name to filter (None = all products)
+            level: Category level - 'primary', 'secondary', or 'tertiary'
+            top_n: Number of products to return
+            raw: return pre-rendered RawJSON fragments instead of dicts
+            price_min, price_max: only products whose lowest price is in this range
+        
+        Returns:
+            List of ranked products in the same shape as the popularity ranking;
+            score is the decayed trending score
+        """
+        catalog = ProductService.get_catalog()
+        if not len(catalog):
             return []
         
-        _PRODUCTS_WITH_CATEGORIES = products
-        return _PRODUCTS_WITH_CATEGORIES
+        wanted = None
+        if category:
+            if level not in catalog.categories:
+                return []
+            wanted = catalog.categories[level].find(category)
+            if wanted <= 0:
+                return []
+            canonical = catalog.categories[level].canonical
+            column = catalog.category_ids[level]
+        
+        fragments = ProductService._fragments(catalog) if raw else None
+        out = []
+        for score, pid in _TRENDING.top(DEFAULT_TOP_K):
+            if len(out) >= top_n:
+                break
+            i = catalog.index_of(pid)
+            if i < 0:
+                continue
+            if wanted is not None and canonical[column[i]] != wanted:
+                continue
+            # top-K is small, so the price range is checked per product here
+            price = catalog.price_min[i]
+            if (price_min is not None or price_max is not None) and (
+                    not price or (price_min is not None and price < price_min)
+                    or (price_max is not None and price > price_max)):
+                continue
+            if fragments is not None:
+                out.append(fragments.item('ranking', i, score))
+            else:
+                out.append(ProductService._ranking_item(catalog, i, score))
+        return out
+
+    @staticmethod
+    def on_product_updated(product_id: str, fields: dict):
+        """Apply fresh rating/reviews/loves_count of one product to the current catalog.
+        
+        Only the changed product is re-scored and repositioned in the precomputed
+        rankings; products not in the catalog are left to the next reload/sync.
+        
+        Returns:
+            True if the catalog was updated
+        """
+        if not _CATALOG_MANAGER.is_ready or not isinstance(fields, dict) or fields.get('error'):
+            return False
+        catalog = _CATALOG_MANAGER.current()
+        i = catalog.index_of(product_id)
+        if i < 0:
+            return False
+        
+        try:
+            rating = float(fields.get('rating', catalog.ratings[i]) or 0)
+            reviews = int(fields.get('reviews', catalog.reviews[i]) or 0)
+            loves = int(fields.get('loves_count', catalog.loves_counts[i]) or 0)
+        except (TypeError, ValueError):
+            return False
+        
+        catalog.set_popularity(i, rating, reviews, loves)
+        ProductService._fragments(catalog).refresh(i)
+        # price-filtered rankings and similar-product orderings use the old popularity
+        OrderingCache.for_catalog(catalog).clear()
+        ProductService._result_cache(catalog).clear()
+        ProductService._rescore(catalog, i)
+        return True
+
+    @staticmethod
+    def skin_segment(email: str):
+        """Personalized ranking segment of a user: their skin type, if it is one of SKIN_SEGMENTS."""
+        from app.services.user_service import UserService
+        
+        if not email:
+            return None
+        user, _, _ = UserService.get_user(email)
+        skin_type = ((user or {}).get('skin_profile') or {}).get('skin_type')
+        skin_type = (skin_type or '').strip().lower()
+        return skin_type if skin_type in SKIN_SEGMENTS else None
 
     @staticmethod
     def get_ranking_by_category(category: str = None, level: str = 'primary', top_n: int = 20):
@@ -469,96 +768,177 @@ class ProductService:
         Returns:
             List of ranked products with category info
         """
-        products = ProductService.load_products_with_categories()
-        if not products:
-            return []
+        return ProductService.get_ranking_page(category=category, level=level, page_size=top_n)[0]
+
+    @staticmethod
+    def get_ranking_page(category: str = None, level: str = 'primary', page_size: int = 20, cursor: str = None,
+                         segment: str = None, raw: bool = False, price_min: float = None, price_max: float = None):
+        """Get one page of the (category) ranking.
         
-        # Filter by category if specified
-        if category:
-            category_lower = category.lower().strip()
-            level_key = f'{level}_category'
-            filtered = []
-            for p in products:
-                cat_value = (p.get(level_key) or '').lower().strip()
-                if cat_value == category_lower:
-                    filtered.append(p)
-            products = filtered
-        
-        if not products:
-            return []
+        Args:
+            category: Category name to filter (None = all products)
+            level: Category level - 'primary', 'secondary', or 'tertiary'
+            page_size: Number of products to return
+            cursor: next_cursor of the previous page; replaces category, level, segment and prices
+            segment: skin-type segment (see skin_segment) for a personalized ranking;
+                ignored by the mongo ranking backend
+            raw: return pre-rendered RawJSON fragments instead of dicts
+            price_min, price_max: only products whose lowest price is in this range
+                (resolved with the price index; not supported by the mongo ranking backend)
         
-        # Score and rank
-        scored = []
-        for p in products:
-            try:
-                rating = float(p.get('rating') or 0)
-            except Exception:
-                rating = 0.0
-            try:
-                reviews = int(p.get('reviews') or 0)
-            except Exception:
-                reviews = 0
-            
-            score = rating * 3.0 + min(reviews / 100.0, 20.0)
-            scored.append((score, p))
+        Returns:
+            (ranked products, next_cursor or None on the last page)
         
-        scored.sort(key=lambda x: x[0], reverse=True)
+        Raises:
+            CursorError: cursor is invalid or was issued for an older catalog generation
+            UnsupportedFilterError: price range with the mongo ranking backend
+        """
+        if RANKING_BACKEND == 'mongo':
+            if price_min is not None or price_max is not None:
+                raise UnsupportedFilterError('price_min/price_max are not supported by the mongo ranking backend')
+            return ProductService._get_ranking_page_mongo(category, level, page_size, cursor)
         
-        # Dedupe and format output
-        out = []
-        seen_ids = set()
-        for score, p in scored:
-            pid = p.get('product_id')
-            if pid in seen_ids:
-                continue
-            seen_ids.add(pid)
-            
-            out.append({
-                'product_id': pid,
-                'product_name': p.get('product_name'),
-                'brand_name': p.get('brand_name'),
-                'rating': p.get('rating'),
-                'reviews': p.get('reviews'),
-                'primary_category': p.get('primary_category'),
-                'secondary_category': p.get('secondary_category'),
-                'tertiary_category': p.get('tertiary_category'),
-                'price_usd': p.get('listPrice'),
-                'image_url': p.get('image_url'),
-                'target_url': p.get('target_url'),
-                'skuId': p.get('skuId'),
-                'score': round(score, 2)
-            })
-            
-            if len(out) >= top_n:
-                break
+        catalog = ProductService.get_catalog()
+        params, offset = {'category': category, 'level': level}, 0
+        if segment:
+            params['segment'] = segment
+        ProductService._add_price_params(params, price_min, price_max)
+        if cursor:
+            params, offset = decode_cursor(cursor, 'ranking', catalog.generation)
+        if not len(catalog):
+            return [], None
         
-        return out
+        # precomputed once per catalog generation (and segment); rows are unique per product_id
+        if params.get('segment') in SKIN_SEGMENTS:
+            index = SegmentRankings.for_catalog(catalog).get(params['segment'], ProductService._segment_relevance)
+        else:
+            index = RankingIndex.for_catalog(catalog)
+        category, level = params.get('category'), params.get('level')
+        if not category:
+            ranked = index.global_view
+        elif level not in catalog.categories:
+            ranked = None
+        else:
+            # Filter by category: lookup of the precomputed per-category view
+            wanted = catalog.categories[level].find(category)
+            ranked = index.view(level, wanted) if wanted > 0 else None
+        
+        rows = ProductService._price_rows(catalog, params)
+        if ranked is not None and rows is not None:
+            # only the rows in the price range, in ranking order
+            wanted_level = level if category else None
+            wanted_id = catalog.categories[level].find(category) if category else 0
+            ranked = OrderingCache.for_catalog(catalog).get(
+                ('ranking', params.get('segment'), wanted_level, wanted_id, params.get('price_min'), params.get('price_max')),
+                lambda: ProductService._ranked_rows(catalog, index, rows, wanted_level, wanted_id))
+        
+        # keyset cursor: rescore() moves products inside this generation's rankings
+        pairs, next_cursor = page(ranked, 'ranking', params, catalog.generation, offset, page_size, keyset=True)
+        if raw:
+            fragments = ProductService._fragments(catalog)
+            return [fragments.item('ranking', i, score) for score, i in pairs], next_cursor
+        return [ProductService._ranking_item(catalog, i, score) for score, i in pairs], next_cursor
 
     @staticmethod
-    def get_categories_list(level: str = 'all'):
+    def _add_price_params(params: dict, price_min: float = None, price_max: float = None):
+        if price_min is not None:
+            params['price_min'] = price_min
+        if price_max is not None:
+            params['price_max'] = price_max
+
+    @staticmethod
+    def _price_rows(catalog, params: dict):
+        """Rows in the params' price range from the price index, or None without a price filter."""
+        price_min, price_max = params.get('price_min'), params.get('price_max')
+        if price_min is None and price_max is None:
+            return None
+        try:
+            price_min = None if price_min is None else float(price_min)
+            price_max = None if price_max is None else float(price_max)
+        except (TypeError, ValueError):
+            raise CursorError('invalid cursor')
+        return PriceIndex.for_catalog(catalog).rows_between(price_min, price_max)
+
+    @staticmethod
+    def _ranked_rows(catalog, index, rows, level: str = None, category_id: int = 0):
+        """(score, row) pairs of `rows` (optionally only one category) in `index`'s ranking order."""
+        if level:
+            canonical = catalog.categories[level].canonical
+            column = catalog.category_ids[level]
+            rows = [r for r in rows if canonical[column[r]] == category_id]
+        scores = index.scores
+        return sorted(((scores[r], r) for r in rows), key=lambda x: (-x[0], x[1]))
+
+    @staticmethod
+    def _fragments(catalog):
+        """Pre-rendered list items of every product, built once per catalog generation."""
+        return ProductFragments.for_catalog(catalog, {
+            'ranking': FragmentShape(ProductService._ranking_item, 'score', 2),
+            'search': FragmentShape(ProductService._search_item, 'similarity_score', 3),
+            'similar': FragmentShape(ProductService._similar_item, 'similarity_score', 2),
+        })
+
+    @staticmethod
+    def _result_cache(catalog):
+        return ResultCache.for_catalog(catalog, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, _RESULT_CACHE_STATS)
+
+    @staticmethod
+    def cached_response(key: tuple, build):
+        """Ready-to-send response body for `key` in the current catalog generation.
+        
+        Args:
+            key: Everything the response depends on besides the catalog (endpoint, normalized query, top_n, ...)
+            build: Returns the body bytes on a miss, or None for a response that must not be cached
+        """
+        return ProductService._result_cache(ProductService.get_catalog()).get(key, build)
+
+    @staticmethod
+    def result_cache_stats():
+        """Hit/miss counters of the search/similar response cache since startup."""
+        stats = _RESULT_CACHE_STATS.snapshot()
+        stats.update({
+            'entries': len(ProductService._result_cache(ProductService.get_catalog())),
+            'max_entries': RESULT_CACHE_SIZE,
+            'ttl_seconds': RESULT_CACHE_TTL,
+            'generation': _CATALOG_MANAGER.generation,
+        })
+        return stats
+
+    @staticmethod
+    def get_categories_list(level: str = 'all', price_min: float = None, price_max: float = None):
         """Get list of available categories with product counts.
         
         Args:
             level: 'primary', 'secondary', 'tertiary', or 'all'
+            price_min, price_max: only count products whose lowest price is in this range
         
         Returns:
             Dict with category lists and counts
         """
-        products = ProductService.load_products_with_categories()
-        if not products:
+        catalog = ProductService.get_catalog()
+        if not len(catalog):
             return {}
         
         result = {}
         levels = ['primary', 'secondary', 'tertiary'] if level == 'all' else [level]
+        # counted once per catalog generation
+        tree = CategoryTree.for_catalog(catalog)
+        params = {}
+        ProductService._add_price_params(params, price_min, price_max)
+        rows = ProductService._price_rows(catalog, params)
         
         for lvl in levels:
-            category_key = f'{lvl}_category'
-            counts = {}
+            table = catalog.categories[lvl]
+            id_counts = tree.level_counts[lvl]
+            if rows is not None:
+                # count only the products the price index returns
+                column = catalog.category_ids[lvl]
+                id_counts = [0] * len(table)
+                for i in rows:
+                    id_counts[column[i]] += 1
             
-            for p in products:
-                cat = (p.get(category_key) or '').strip()
-                if cat:
-                    counts[cat] = counts.get(cat, 0) + 1
+            # id 0 is the empty category
+            counts = {table.values[cid]: count for cid, count in enumerate(id_counts) if cid and count}
             
             # Sort by count descending
             sorted_cats = sorted(counts.items(), key=lambda x: x[1], reverse=True)
@@ -569,6 +949,43 @@ class ProductService:
         
         return result
 
+    @staticmethod
+    def get_category_tree():
+        """Get the primary -> secondary -> tertiary category tree with product counts.
+        
+        Returns:
+            (pre-serialized JSON body, ETag) of the current catalog generation
+        """
+        tree = CategoryTree.for_catalog(ProductService.get_catalog())
+        return tree.body, tree.etag
+
+    @staticmethod
+    def suggest(prefix: str, limit: int = SUGGEST_TOP_K):
+        """Autocomplete product, brand and category names starting with `prefix`.
+        
+        Args:
+            prefix: What the user has typed so far (case-insensitive)
+            limit: Suggestions per kind (at most SUGGEST_TOP_K)
+            
+        Returns:
+            dict with the most popular matching products, brands and categories
+        """
+        catalog = ProductService.get_catalog()
+        index = SuggestIndex.for_catalog(catalog)
+        limit = max(0, min(limit, SUGGEST_TOP_K))
+        products = [{
+            'product_id': catalog.product_ids[i],
+            'product_name': catalog.names[i],
+            'brand_name': catalog.brand_name(i),
+            'image_url': catalog.image_urls[i],
+        } for i in index.product_rows(prefix, limit)]
+        return {
+            'prefix': prefix,
+            'products': products,
+            'brands': index.brand_names(prefix, limit),
+            'categories': index.category_names(prefix, limit),
+        }
+
     @staticmethod
     def find_product_by_name(query: str, top_n: int = 1):
         """Find products by name similarity and return with main_image.
@@ -576,67 +993,141 @@ class ProductService:
         Uses fuzzy string matching on product names from unified products file.
         Returns list of dicts with product_id, product_name, brand_name, image_url, rating, reviews.
         """
-        from difflib import SequenceMatcher
+        return ProductService.search_products_page(query, page_size=top_n)[0]
+
+    @staticmethod
+    def correct_query(query: str) -> str:
+        """Spell-correct `query` against the words of product and brand names.
         
-        products = ProductService.load_products_with_categories()
+        Returns:
+            the lowercased query with misspelled words replaced (unchanged if none is)
+        """
+        return SpellingIndex.for_catalog(ProductService.get_catalog()).correct(query)
+
+    @staticmethod
+    def search_products_page(query: str, page_size: int = 1, cursor: str = None, raw: bool = False,
+                             price_min: float = None, price_max: float = None, mode: str = 'fuzzy'):
+        """Get one page of find_product_by_name() results.
         
-        if not products or not query:
-            return []
+        The full ordering of a query is computed once per catalog generation and
+        kept in an LRU, so later pages are slices of it. With raw=True the
+        products are pre-rendered RawJSON fragments instead of dicts. A price
+        range limits the products scored to those the price index returns.
+        mode='bm25' ranks by BM25 over name, brand, highlights and ingredients
+        instead of fuzzy name similarity.
         
-        query_lower = query.lower().strip()
-        scored = []
+        Returns:
+            (products, next_cursor or None on the last page)
         
-        for p in products:
-            name = (p.get('product_name') or '').lower()
-            brand = (p.get('brand_name') or '').lower()
-            
+        Raises:
+            CursorError: cursor is invalid or was issued for an older catalog generation
+        """
+        catalog = ProductService.get_catalog()
+        params, offset = {'query': (query or '').lower().strip()}, 0
+        if mode == 'bm25':
+            params['mode'] = mode
+        ProductService._add_price_params(params, price_min, price_max)
+        if cursor:
+            params, offset = decode_cursor(cursor, 'search', catalog.generation)
+        elif not query:
+            return [], None
+        if not len(catalog):
+            return [], None
+        
+        query_lower = params.get('query') or ''
+        rows = ProductService._price_rows(catalog, params)
+        if params.get('mode') == 'bm25':
+            compute = lambda: BM25Index.for_catalog(catalog).search(query_lower, rows=rows)
+        else:
+            compute = lambda: ProductService._search_ordering(catalog, query_lower, rows)
+        ordering = OrderingCache.for_catalog(catalog).get(
+            ('search', params.get('mode', 'fuzzy'), query_lower, params.get('price_min'), params.get('price_max')),
+            compute)
+        pairs, next_cursor = page(ordering, 'search', params, catalog.generation, offset, page_size)
+        
+        if raw:
+            fragments = ProductService._fragments(catalog)
+            return [fragments.item('search', i, score) for score, i in pairs], next_cursor
+        return [ProductService._search_item(catalog, i, score) for score, i in pairs], next_cursor
+
+    @staticmethod
+    def _search_item(catalog, i: int, score: float):
+        return {
+            'product_id': catalog.product_ids[i],
+            'product_name': catalog.names[i],
+            'brand_name': catalog.brand_name(i),
+            'image_url': catalog.image_urls[i],
+            'target_url': catalog.target_urls[i],
+            'rating': catalog.ratings[i],
+            'reviews': catalog.reviews[i],
+            'price': catalog.list_prices[i],
+            'similarity_score': round(score, 3)
+        }
+
+    @staticmethod
+    def _search_ordering(catalog, query_lower: str, rows=None, limit: int = RESULT_LIMIT):
+        """The best `limit` (score, row) name matches for `query_lower`, best first; optionally only `rows`.
+        
+        Products are visited in decreasing order of an upper bound of their score
+        (from the characters the name shares with the query) and only scored when
+        a tighter bound (the longest common subsequence) can still reach the
+        limit-th best score so far, so the result is exactly that of scoring every
+        product.
+        """
+        import heapq
+        from difflib import SequenceMatcher
+        
+        # brand boost only depends on the brand, so evaluate it once per brand
+        brand_boost = [0.2 if query_lower in b else 0.0 for b in catalog.brands.lower]
+        brand_ids = catalog.brand_ids
+        size = len(query_lower)
+        
+        # the score's operations with M replaced by a bound; only a name holding
+        # the whole query can contain it
+        names = NameIndex.for_catalog(catalog)
+        shared = names.common_characters(query_lower)
+        if shared is None:
+            bound = np.full(len(catalog), np.inf)
+        else:
+            bound = 2.0 * shared / (size + names.lengths)
+            bound += np.where(shared == size, 0.3, 0.0)
+            bound += np.asarray(brand_boost)[np.asarray(brand_ids)]
+        if rows is not None:
+            allowed = np.zeros(len(catalog), dtype=bool)
+            allowed[np.asarray(rows, dtype=np.int64)] = True
+            bound[~allowed] = -np.inf
+        
+        common_subsequence = lcs_counter(query_lower)
+        matcher = SequenceMatcher(None, query_lower)
+        # min-heap of (score, -row): its top is the worst match kept (ties: the last row)
+        best = []
+        names_lower = catalog.names_lower
+        bounds = bound.tolist()
+        for i in np.argsort(-bound, kind='stable').tolist():
+            if bounds[i] <= 0.1 or (len(best) == limit and bounds[i] < best[0][0]):
+                break
+            name = names_lower[i]
+            common = common_subsequence(name)
+            tighter = 2.0 * common / (size + len(name)) + (0.3 if common == size else 0.0) + brand_boost[brand_ids[i]]
+            if tighter <= 0.1 or (len(best) == limit and tighter < best[0][0]):
+                continue
             # Calculate similarity score
-            name_score = SequenceMatcher(None, query_lower, name).ratio()
+            matcher.set_seq2(name)
+            name_score = matcher.ratio()
             # Boost if query is substring
             if query_lower in name:
                 name_score += 0.3
             # Boost if brand matches
-            if query_lower in brand:
-                name_score += 0.2
+            name_score += brand_boost[brand_ids[i]]
             
             if name_score > 0.1:  # threshold
-                scored.append((name_score, p))
+                if len(best) < limit:
+                    heapq.heappush(best, (name_score, -i))
+                elif (name_score, -i) > best[0]:
+                    heapq.heapreplace(best, (name_score, -i))
         
-        scored.sort(key=lambda x: x[0], reverse=True)
-        
-        out = []
-        seen_ids = set()
-        for score, p in scored:
-            pid = p.get('product_id')
-            if pid in seen_ids:
-                continue
-            seen_ids.add(pid)
-            
-            try:
-                rating = float(p.get('rating') or 0)
-            except Exception:
-                rating = 0.0
-            try:
-                reviews = int(p.get('reviews') or 0)
-            except Exception:
-                reviews = 0
-            
-            out.append({
-                'product_id': pid,
-                'product_name': p.get('product_name'),
-                'brand_name': p.get('brand_name'),
-                'image_url': p.get('image_url'),
-                'target_url': p.get('target_url'),
-                'rating': rating,
-                'reviews': reviews,
-                'price': p.get('listPrice'),
-                'similarity_score': round(score, 3)
-            })
-            
-            if len(out) >= top_n:
-                break
-        
-        return out
+        # best score first, ties in catalog order
+        return [(score, -negated) for score, negated in sorted(best, key=lambda x: (-x[0], -x[1]))]
 
     @staticmethod
     def find_similar_products(product_id: str, top_n: int = 10):
@@ -649,123 +1140,200 @@ class ProductService:
         Returns:
             List of similar products with similarity scores
         """
-        products = ProductService.load_products_with_categories()
-        if not products:
-            return []
+        return ProductService.similar_products_page(product_id, page_size=top_n)[0]
+
+    @staticmethod
+    def similar_products_page(product_id: str, page_size: int = 10, cursor: str = None, raw: bool = False):
+        """Get one page of find_similar_products() results.
+        
+        With raw=True the products are pre-rendered RawJSON fragments instead of dicts.
+        
+        Returns:
+            (similar products, next_cursor or None on the last page)
+        
+        Raises:
+            CursorError: cursor is invalid or was issued for an older catalog generation
+        """
+        catalog = ProductService.get_catalog()
+        params, offset = {'product_id': product_id}, 0
+        if cursor:
+            params, offset = decode_cursor(cursor, 'similar', catalog.generation)
+        if not len(catalog):
+            return [], None
         
         # Find the target product
-        target = None
-        for p in products:
-            if p.get('product_id') == product_id:
-                target = p
-                break
+        t = catalog.index_of(params.get('product_id') or '')
+        if t < 0:
+            return [], None
         
-        if not target:
-            return []
+        ordering = OrderingCache.for_catalog(catalog).get(
+            ('similar', t), lambda: ProductService._similar_ordering(catalog, t))
+        pairs, next_cursor = page(ordering, 'similar', params, catalog.generation, offset, page_size)
         
-        # Extract target product features
-        target_name = (target.get('product_name') or '').lower()
-        target_brand = (target.get('brand_name') or '').lower()
-        target_primary = (target.get('primary_category') or '').lower()
-        target_secondary = (target.get('secondary_category') or '').lower()
-        target_tertiary = (target.get('tertiary_category') or '').lower()
+        # Format output
+        if raw:
+            fragments = ProductService._fragments(catalog)
+            return [fragments.item('similar', i, score) for score, i in pairs], next_cursor
+        return [ProductService._similar_item(catalog, i, score) for score, i in pairs], next_cursor
+
+    @staticmethod
+    def _similar_item(catalog, i: int, score: float):
+        return {
+            'product_id': catalog.product_ids[i],
+            'product_name': catalog.names[i],
+            'brand_name': catalog.brand_name(i),
+            'rating': catalog.ratings[i],
+            'reviews': catalog.reviews[i],
+            'primary_category': catalog.category('primary', i),
+            'secondary_category': catalog.category('secondary', i),
+            'tertiary_category': catalog.category('tertiary', i),
+            'price': catalog.list_prices[i],
+            'image_url': catalog.image_urls[i],
+            'target_url': catalog.target_urls[i],
+            'similarity_score': round(score, 2)
+        }
+
+    @staticmethod
+    def _similar_ordering(catalog, t: int):
+        """All (score, row) products similar to row `t`, most similar first."""
+        # Extract target product features (canonical ids compare case-insensitively)
+        primary_ids = catalog.category_ids['primary']
+        secondary_ids = catalog.category_ids['secondary']
+        tertiary_ids = catalog.category_ids['tertiary']
+        primary_canon = catalog.categories['primary'].canonical
+        secondary_canon = catalog.categories['secondary'].canonical
+        tertiary_canon = catalog.categories['tertiary'].canonical
+        brand_canon = catalog.brands.canonical
+        target_primary = primary_canon[primary_ids[t]]
+        target_secondary = secondary_canon[secondary_ids[t]]
+        target_tertiary = tertiary_canon[tertiary_ids[t]]
+        target_brand = brand_canon[catalog.brand_ids[t]]
+        target_price = catalog.price_min[t]
         
-        try:
-            target_price = float(target.get('listPrice', '0').replace('$', '').split('-')[0].strip())
-        except Exception:
-            target_price = 0
+        # Name/keyword similarity only counts keywords the target name contains
+        common_keywords = ['serum', 'cream', 'oil', 'cleanser', 'mask', 'moisturizer',
+                          'toner', 'sunscreen', 'treatment', 'essence', 'gel', 'balm']
+        target_name = catalog.names_lower[t]
+        target_keywords = [k for k in common_keywords if k in target_name]
         
-        # Calculate similarity for each product (with deduplication)
+        # Calculate similarity for each product
         similarities = []
-        seen_ids = set()
         
-        for p in products:
-            pid = p.get('product_id')
-            if pid == product_id:  # Skip the target product itself
+        for i in range(len(catalog)):
+            if i == t:  # Skip the target product itself
                 continue
             
-            if pid in seen_ids:  # Skip duplicates
-                continue
-            seen_ids.add(pid)
-            
             score = 0.0
             
             # Category matching (most important)
-            primary = (p.get('primary_category') or '').lower()
-            secondary = (p.get('secondary_category') or '').lower()
-            tertiary = (p.get('tertiary_category') or '').lower()
-            
-            if primary == target_primary:
+            if primary_canon[primary_ids[i]] == target_primary:
                 score += 40  # Same primary category
-                if secondary == target_secondary:
+                if secondary_canon[secondary_ids[i]] == target_secondary:
                     score += 25  # Same secondary category
-                    if tertiary == target_tertiary and tertiary:
+                    if tertiary_ids[i] and tertiary_canon[tertiary_ids[i]] == target_tertiary:
                         score += 15  # Same tertiary category
             
             # Brand matching
-            brand = (p.get('brand_name') or '').lower()
-            if brand == target_brand:
+            if brand_canon[catalog.brand_ids[i]] == target_brand:
                 score += 20
             
             # Price similarity (within 30% range)
-            try:
-                price = float(p.get('listPrice', '0').replace('$', '').split('-')[0].strip())
-                if target_price > 0 and price > 0:
-                    price_diff = abs(price - target_price) / target_price
-                    if price_diff <= 0.3:
-                        score += 15 * (1 - price_diff / 0.3)
-            except Exception:
-                pass
+            price = catalog.price_min[i]
+            if target_price > 0 and price > 0:
+                price_diff = abs(price - target_price) / target_price
+                if price_diff <= 0.3:
+                    score += 15 * (1 - price_diff / 0.3)
             
-            # Name/keyword similarity
-            name = (p.get('product_name') or '').lower()
-            common_keywords = ['serum', 'cream', 'oil', 'cleanser', 'mask', 'moisturizer',
-                              'toner', 'sunscreen', 'treatment', 'essence', 'gel', 'balm']
-            for keyword in common_keywords:
-                if keyword in target_name and keyword in name:
+            name = catalog.names_lower[i]
+            for keyword in target_keywords:
+                if keyword in name:
                     score += 3
             
             # Rating bonus (prefer highly-rated similar products)
-            try:
-                rating = float(p.get('rating') or 0)
-                score += rating * 0.5
-            except Exception:
-                pass
+            score += catalog.ratings[i] * 0.5
             
             if score > 10:  # Minimum threshold
-                similarities.append((score, p))
+                similarities.append((score, i))
         
         # Sort by similarity score
         similarities.sort(key=lambda x: x[0], reverse=True)
+        return similarities
+
+    @staticmethod
+    def _catalog_item(catalog, i: int):
+        return {
+            'product_id': catalog.product_ids[i],
+            'product_name': catalog.names[i],
+            'brand_name': catalog.brand_name(i),
+            'rating': catalog.ratings[i],
+            'reviews': catalog.reviews[i],
+            'loves_count': catalog.loves_counts[i],
+            'primary_category': catalog.category('primary', i),
+            'secondary_category': catalog.category('secondary', i),
+            'tertiary_category': catalog.category('tertiary', i),
+            'price': catalog.list_prices[i],
+            'price_min': catalog.price_min[i],
+            'price_max': catalog.price_max[i],
+            'image_url': catalog.image_urls[i],
+            'target_url': catalog.target_urls[i],
+            'skuId': catalog.sku_ids[i],
+            'variants': ProductService._variants_payload(catalog, i),
+        }
+
+    @staticmethod
+    def get_products_batch(product_ids: list):
+        """Get several products at once.
         
-        # Format output
-        out = []
-        for score, p in similarities[:top_n]:
-            try:
-                rating = float(p.get('rating') or 0)
-            except Exception:
-                rating = 0.0
-            try:
-                reviews = int(p.get('reviews') or 0)
-            except Exception:
-                reviews = 0
-            
-            out.append({
-                'product_id': p.get('product_id'),
-                'product_name': p.get('product_name'),
-                'brand_name': p.get('brand_name'),
-                'rating': rating,
-                'reviews': reviews,
-                'primary_category': p.get('primary_category'),
-                'secondary_category': p.get('secondary_category'),
-                'tertiary_category': p.get('tertiary_category'),
-                'price': p.get('listPrice'),
-                'image_url': p.get('image_url'),
-                'target_url': p.get('target_url'),
-                'similarity_score': round(score, 2)
-            })
+        Catalog fields come from the in-memory primary-key index; fields cached by
+        Sephora detail refreshes are filled in with one $in query against
+        db.products and one against db.product_details.
         
-        return out
+        Args:
+            product_ids: Product IDs, in the order the results should be returned
+        
+        Returns:
+            (products, missing_ids)
+        """
+        from app import mongoDb
+        
+        ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        if not ids:
+            return [], []
+        
+        catalog = ProductService.get_catalog()
+        
+        cached_products = {}
+        cached_details = {}
+        try:
+            for doc in mongoDb.db.products.find({'product_id': {'$in': ids}}, {'_id': 0}):
+                cached_products[doc['product_id']] = doc
+            for doc in mongoDb.db.product_details.find({'product_id': {'$in': ids}}, {'_id': 0}):
+                cached_details[doc['product_id']] = doc
+        except Exception as e:
+            # 캐시 조회 실패 시에는 카탈로그 필드만 반환
+            print(f"Error fetching from MongoDB: {e}")
+        
+        products = []
+        missing = []
+        for pid in ids:
+            i = catalog.index_of(pid)
+            doc = cached_products.get(pid)
+            if i >= 0:
+                item = ProductService._catalog_item(catalog, i)
+                if doc:
+                    for key in BATCH_DETAIL_FIELDS:
+                        if key in doc:
+                            item[key] = doc[key]
+            elif doc:
+                item = doc
+            else:
+                missing.append(pid)
+                continue
+            if pid in cached_details:
+                item['detail'] = cached_details[pid]
+            products.append(item)
+        
+        return products, missing
 
     @staticmethod
     def get_product_by_id(product_id: str):
@@ -848,6 +1416,11 @@ class ProductService:
                     upsert=True
                 )
                 
+                # 4. Move the product in the rankings right away
+                ProductService.on_product_updated(product_id, api_data)
+                if RANKING_BACKEND == 'mongo':
+                    MongoRankingBackend.rescore(product_id)
+                
                 return api_data
             else:
                 return {'error': 'Failed to fetch from API'}
@@ -0,0 +1,213 @@
+"""
+Precomputed popularity rankings.
+
+For every catalog generation the products are scored once and sorted into a
+global view plus one view per primary/secondary/tertiary category, so a
+/products/ranking request is a dictionary lookup and a slice. When the
+popularity of a single product changes, rescore() moves just that product
+within the views it belongs to.
+
+Personalized rankings are the same structure with a per-skin-type relevance
+boost added to every score; there are only a few segments, so each one is
+built once per generation on first use (SegmentRankings).
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.catalog import CATEGORY_LEVELS, ProductCatalog
+from app.services.scoring import ScoringEngine, as_array, rank_order
+
+
+class RankedList:
+    """One ranking view: (-score, row) keys kept in ascending order.
+
+    Ties keep catalog row order, matching a stable sort by score. Keys are
+    stored in sorted blocks of about BLOCK_SIZE keys with the last key of each
+    block alongside, so move() finds a key with two bisections and only shifts
+    the keys of the blocks it touches, instead of the whole view.
+    """
+
+    BLOCK_SIZE = 512
+
+    def __init__(self, keys: List[Tuple[float, int]]):
+        size = self.BLOCK_SIZE
+        self._blocks = [keys[k:k + size] for k in range(0, len(keys), size)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(keys)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def keys(self) -> List[Tuple[float, int]]:
+        with self._lock:
+            return [key for block in self._blocks for key in block]
+
+    def _pairs(self, block: int, pos: int, n: int) -> List[Tuple[float, int]]:
+        # n keys from position `pos` of block `block` on; caller holds the lock
+        out = []
+        while n > len(out) and block < len(self._blocks):
+            out.extend(self._blocks[block][pos:pos + n - len(out)])
+            block, pos = block + 1, 0
+        return [(-neg, i) for neg, i in out]
+
+    def top(self, n: int, offset: int = 0) -> List[Tuple[float, int]]:
+        """Return up to n (score, row) pairs starting at `offset`."""
+        with self._lock:
+            block = 0
+            while block < len(self._blocks) and offset >= len(self._blocks[block]):
+                offset -= len(self._blocks[block])
+                block += 1
+            return self._pairs(block, offset, n)
+
+    def after(self, score: float, row: int, n: int) -> List[Tuple[float, int]]:
+        """Return up to n (score, row) pairs ranked after (score, row), which need not be in the view."""
+        key = (-score, row)
+        with self._lock:
+            block = bisect_right(self._maxes, key)
+            if block == len(self._blocks):
+                return []
+            return self._pairs(block, bisect_right(self._blocks[block], key), n)
+
+    def move(self, row: int, old_score: float, new_score: float):
+        """Reposition `row` from `old_score` to `new_score`, both found by bisection."""
+        old_key = (-old_score, row)
+        with self._lock:
+            block = bisect_left(self._maxes, old_key)
+            if block < len(self._blocks):
+                keys = self._blocks[block]
+                pos = bisect_left(keys, old_key)
+                if pos < len(keys) and keys[pos] == old_key:
+                    del keys[pos]
+                    self._len -= 1
+                    if not keys:
+                        del self._blocks[block]
+                        del self._maxes[block]
+                    else:
+                        self._maxes[block] = keys[-1]
+            self._insert((-new_score, row))
+
+    def _insert(self, key: Tuple[float, int]):
+        # caller holds the lock
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            return
+        # the first block whose last key is not smaller, or the last block
+        block = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        keys = self._blocks[block]
+        insort(keys, key)
+        self._maxes[block] = keys[-1]
+        if len(keys) > 2 * self.BLOCK_SIZE:
+            half = len(keys) // 2
+            self._blocks[block:block + 1] = [keys[:half], keys[half:]]
+            self._maxes[block:block + 1] = [keys[half - 1], keys[-1]]
+
+
+class RankingIndex:
+    KEY = 'ranking_index'
+
+    def __init__(self, catalog: ProductCatalog, engine: ScoringEngine = None, boost: np.ndarray = None):
+        self.engine = engine or ScoringEngine.named('ranking')
+        # per-row points added to the engine score (segment relevance)
+        self.boost = boost
+        scores = self.engine.score_catalog(catalog)
+        if boost is not None:
+            scores = scores + boost
+        order = rank_order(scores)
+        # current score of every row, to find its keys again in rescore()
+        self.scores = scores.tolist()
+        self._update_lock = threading.Lock()
+        self.global_view = RankedList(list(zip((-scores[order]).tolist(), order.tolist())))
+
+        self.category_views: Dict[Tuple[str, int], RankedList] = {}
+        for level in CATEGORY_LEVELS:
+            canonical = np.asarray(catalog.categories[level].canonical, dtype=np.int64)
+            # category of every product, in global ranking order
+            cids = canonical[as_array(catalog.category_ids[level], np.uint32)][order]
+            # a stable sort by category keeps the ranking order inside each category
+            by_cid = np.argsort(cids, kind='stable')
+            sorted_cids = cids[by_cid]
+            bounds = np.flatnonzero(np.diff(sorted_cids)) + 1
+            for chunk in np.split(by_cid, bounds):
+                cid = int(cids[chunk[0]]) if len(chunk) else 0
+                if not cid:
+                    continue
+                rows = order[chunk]
+                self.category_views[(level, cid)] = RankedList(
+                    list(zip((-scores[rows]).tolist(), rows.tolist())))
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'RankingIndex':
+        return catalog.derived(cls.KEY, cls)
+
+    def view(self, level: str, category_id: int) -> Optional[RankedList]:
+        """Ranking of one category, by the StringTable canonical id of its name."""
+        return self.category_views.get((level, category_id))
+
+    def rescore(self, catalog: ProductCatalog, i: int) -> float:
+        """Re-score row i from its current columns and move it in every view it is in.
+
+        Only popularity may have changed; a changed category needs a new
+        catalog generation.
+        """
+        new_score = float(self.engine.score([catalog.ratings[i]], [catalog.reviews[i]],
+                                            [catalog.loves_counts[i]])[0])
+        if self.boost is not None and i < len(self.boost):
+            new_score = float(new_score + self.boost[i])
+        with self._update_lock:
+            if i >= len(self.scores):
+                # appended after this index was built; the next rebuild picks it up
+                return new_score
+            old_score = self.scores[i]
+            if new_score == old_score:
+                return new_score
+            self.scores[i] = new_score
+            self.global_view.move(i, old_score, new_score)
+            for level in CATEGORY_LEVELS:
+                cid = catalog.categories[level].canonical[catalog.category_ids[level][i]]
+                ranked = self.category_views.get((level, cid)) if cid else None
+                if ranked is not None:
+                    ranked.move(i, old_score, new_score)
+        return new_score
+
+
+SKIN_SEGMENTS = ('dry', 'oily', 'combination', 'normal', 'sensitive')
+
+
+class SegmentRankings:
+    """Personalized RankingIndex of each skin-type segment, built on first use."""
+
+    KEY = 'segment_rankings'
+
+    def __init__(self, catalog: ProductCatalog):
+        self._catalog = catalog
+        self._indexes: Dict[str, RankingIndex] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'SegmentRankings':
+        return catalog.derived(cls.KEY, cls)
+
+    def get(self, segment: str, relevance: Callable[[ProductCatalog, str], Sequence[float]]) -> RankingIndex:
+        """Ranking of `segment`; relevance(catalog, segment) scores every row on a miss."""
+        index = self._indexes.get(segment)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._indexes.get(segment)
+            if index is None:
+                engine = ScoringEngine.named('personalized')
+                values = np.asarray(relevance(self._catalog, segment), dtype=np.float64)
+                peak = values.max() if len(values) else 0.0
+                boost = values * (engine.weights.get('relevance_weight', 0.0) / peak) if peak > 0 else None
+                index = self._indexes[segment] = RankingIndex(self._catalog, engine=engine, boost=boost)
+        return index
+
+    def built(self) -> List[RankingIndex]:
+        return list(self._indexes.values())
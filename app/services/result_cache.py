@@ -0,0 +1,68 @@
+"""
+Ready-to-send response bodies of the search and similar-products endpoints.
+
+Bodies are kept per catalog generation (so a reload or sync drops them all)
+in a bounded LRU whose entries also expire after a TTL. Hit/miss counters
+live outside the per-generation cache so the hit ratio survives reloads.
+"""
+import re
+import threading
+import unicodedata
+
+from app.services.lru_cache import LRUCache
+
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 300.0
+# larger pages are built on every request instead of pinning big bodies in memory
+MAX_CACHED_TOP_N = 100
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """Case-, whitespace- and unicode-insensitive form of a search query."""
+    return _SPACES.sub(' ', unicodedata.normalize('NFKC', text or '').casefold()).strip()
+
+
+class CacheStats:
+    """Hit/miss counters shared by every generation's ResultCache."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+
+
+class ResultCache(LRUCache):
+    """Least-recently-used response bodies of one catalog generation, each valid for `ttl` seconds."""
+
+    KEY = 'result_cache'
+
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL, stats: CacheStats = None):
+        super().__init__(maxsize, ttl)
+        self.stats = stats if stats is not None else CacheStats()
+
+    @classmethod
+    def for_catalog(cls, catalog, maxsize: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL,
+                    stats: CacheStats = None) -> 'ResultCache':
+        return catalog.derived(cls.KEY, lambda c: cls(maxsize, ttl, stats))
+
+    def _record(self, hit: bool):
+        self.stats.record(hit)
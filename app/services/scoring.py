@@ -0,0 +1,103 @@
+"""
+Vectorized popularity scoring.
+
+Every popularity formula in the service is an instance of
+
+    score = rating_weight * rating
+            + min(reviews / review_divisor, review_cap)
+            + min(loves_count / loves_divisor, loves_cap)
+
+evaluated over whole catalog columns with NumPy. The weights are named
+weight sets that can be overridden from config (RANKING_WEIGHTS), so a new
+formula rolls out without a code change.
+"""
+import copy
+from typing import Dict, Optional
+
+import numpy as np
+
+DEFAULT_WEIGHT_SETS = {
+    # /products/ranking (global and per category)
+    'ranking': {'rating_weight': 3.0, 'review_divisor': 100.0, 'review_cap': 20.0,
+                'loves_divisor': 0.0, 'loves_cap': 0.0},
+    # /products/ranking?mode=personalized: ranking plus skin-segment relevance
+    # scaled so the most relevant product gets relevance_weight extra points
+    'personalized': {'rating_weight': 3.0, 'review_divisor': 100.0, 'review_cap': 20.0,
+                     'loves_divisor': 0.0, 'loves_cap': 0.0, 'relevance_weight': 10.0},
+    # popularity part of recommend_products
+    'recommend': {'rating_weight': 2.0, 'review_divisor': 0.0, 'review_cap': 0.0,
+                  'loves_divisor': 200.0, 'loves_cap': 8.0},
+    # score_products_and_rank (external product lists)
+    'external': {'rating_weight': 3.0, 'review_divisor': 0.0, 'review_cap': 0.0,
+                 'loves_divisor': 100.0, 'loves_cap': 20.0},
+}
+
+_WEIGHT_SETS = copy.deepcopy(DEFAULT_WEIGHT_SETS)
+
+
+def configure_weight_sets(overrides: Optional[Dict[str, Dict[str, float]]]):
+    """Merge config overrides, e.g. {'ranking': {'rating_weight': 2.5}}, into the defaults."""
+    weight_sets = copy.deepcopy(DEFAULT_WEIGHT_SETS)
+    for name, weights in (overrides or {}).items():
+        weight_sets.setdefault(name, dict(DEFAULT_WEIGHT_SETS['ranking'])).update(
+            {k: float(v) for k, v in weights.items()})
+    global _WEIGHT_SETS
+    _WEIGHT_SETS = weight_sets
+
+
+def as_array(column, dtype) -> np.ndarray:
+    """Zero-copy NumPy view of an `array`/memoryview column, copied for plain lists.
+
+    Don't keep the view around: a growable `array` can't be resized while exported.
+    """
+    try:
+        return np.frombuffer(column, dtype=dtype)
+    except TypeError:
+        return np.asarray(column, dtype=dtype)
+
+
+class ScoringEngine:
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = weights
+
+    @classmethod
+    def named(cls, name: str) -> 'ScoringEngine':
+        return cls(_WEIGHT_SETS[name])
+
+    def score(self, ratings, reviews=None, loves=None) -> np.ndarray:
+        w = self.weights
+        scores = np.asarray(ratings, dtype=np.float64) * w['rating_weight']
+        if reviews is not None and w['review_divisor'] and w['review_cap']:
+            scores += np.minimum(np.asarray(reviews, dtype=np.float64) / w['review_divisor'], w['review_cap'])
+        if loves is not None and w['loves_divisor'] and w['loves_cap']:
+            scores += np.minimum(np.asarray(loves, dtype=np.float64) / w['loves_divisor'], w['loves_cap'])
+        return scores
+
+    def score_catalog(self, catalog) -> np.ndarray:
+        return self.score(as_array(catalog.ratings, np.float64),
+                          as_array(catalog.reviews, np.int64),
+                          as_array(catalog.loves_counts, np.int64))
+
+
+def rank_order(scores: np.ndarray) -> np.ndarray:
+    """All row indices by score descending, ties by row ascending (a stable sort)."""
+    return np.lexsort((np.arange(len(scores)), -scores))
+
+
+def top_k(scores: np.ndarray, k: int, candidates: np.ndarray = None) -> np.ndarray:
+    """Indices of the k best scores (descending, ties by index) using argpartition.
+
+    `candidates` optionally restricts the search to a subset of indices.
+    """
+    if candidates is None:
+        candidates = np.arange(len(scores))
+    if k <= 0 or not len(candidates):
+        return candidates[:0]
+    values = scores[candidates]
+    if k < len(candidates):
+        kth = values[np.argpartition(-values, k - 1)[k - 1]]
+        # keep every tie of the k-th score so the tie order stays deterministic
+        keep = values >= kth
+        candidates, values = candidates[keep], values[keep]
+    order = np.lexsort((candidates, -values))[:k]
+    return candidates[order]
@@ -0,0 +1,112 @@
+"""
+SymSpell-style spelling correction for search queries.
+
+The vocabulary is every token of the product and brand names, counted per
+product. Each word's deletions (up to MAX_EDIT_DISTANCE characters removed
+from its first PREFIX_LENGTH characters) are stored once per catalog
+generation, so correcting a query word only generates the deletions of that
+word, looks them up and measures the edit distance to the few words found,
+however large the vocabulary is.
+"""
+import re
+from typing import Dict, List, Set
+
+from app.services.catalog import ProductCatalog
+from app.services.text_index import BM25Index, tokenize
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+# shorter words are too ambiguous to correct
+MIN_WORD_LENGTH = 4
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    """Every string obtained by removing 1..distance characters from `word`."""
+    found: Set[str] = set()
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:k] + w[k + 1:] for w in frontier if len(w) > 1 for k in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int = None) -> int:
+    """Optimal string alignment distance (Levenshtein plus adjacent transpositions).
+
+    With `limit`, stops early and returns limit + 1 once the distance must exceed it.
+    """
+    # a shared prefix or suffix never changes the distance; typos are usually short
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    # keep one shared character before the difference for transpositions
+    start = max(start - 1, 0)
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    if limit is not None:
+        return min(previous[len(b)], limit + 1)
+    return previous[len(b)]
+
+
+class SpellingIndex:
+    KEY = 'spelling_index'
+
+    def __init__(self, catalog: ProductCatalog):
+        counts: Dict[str, int] = {}
+        for i in range(len(catalog)):
+            for word in set(tokenize(catalog.names_lower[i])) | set(tokenize(catalog.brand_name(i))):
+                counts[word] = counts.get(word, 0) + 1
+        self._counts = counts
+        self._deletes: Dict[str, List[str]] = {}
+        for word in counts:
+            if len(word) < MIN_WORD_LENGTH - MAX_EDIT_DISTANCE or word.isdigit():
+                continue
+            key = word[:PREFIX_LENGTH]
+            for variant in _deletes(key, MAX_EDIT_DISTANCE) | {key}:
+                self._deletes.setdefault(variant, []).append(word)
+        # words of highlights and ingredients are never "corrected" into name words
+        self._terms = BM25Index.for_catalog(catalog)
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'SpellingIndex':
+        return catalog.derived(cls.KEY, cls)
+
+    def correct_word(self, word: str) -> str:
+        """The closest vocabulary word to `word` (lowercase), or `word` itself if none is close."""
+        if (len(word) < MIN_WORD_LENGTH or word in self._counts or word in self._terms
+                or any(c.isdigit() for c in word)):
+            return word
+        distance = 1 if len(word) <= 5 else MAX_EDIT_DISTANCE
+        key = word[:PREFIX_LENGTH]
+        best, best_rank = word, None
+        seen: Set[str] = set()
+        for variant in _deletes(key, distance) | {key}:
+            for candidate in self._deletes.get(variant, ()):
+                if candidate in seen or abs(len(candidate) - len(word)) > distance:
+                    continue
+                seen.add(candidate)
+                d = edit_distance(word, candidate, distance)
+                # closest first, then the word found in the most products
+                rank = (d, -self._counts[candidate], candidate)
+                if d <= distance and (best_rank is None or rank < best_rank):
+                    best, best_rank = candidate, rank
+        return best
+
+    def correct(self, query: str) -> str:
+        """`query` lowercased, with every word replaced by its correction."""
+        return _WORD.sub(lambda m: self.correct_word(m.group()), (query or '').lower())
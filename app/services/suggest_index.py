@@ -0,0 +1,142 @@
+"""
+Prefix autocomplete over product, brand and category names.
+
+Each kind is a PrefixIndex: its keys are sorted once per catalog generation,
+and every prefix of up to MAX_STORED_PREFIX characters shared by more than K
+keys stores its top-K entries by popularity. A suggestion is then a dict
+lookup for popular short prefixes, or a bisection into the sorted keys for
+the rest (at most K keys, or the few sharing a longer prefix).
+"""
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.catalog import CATEGORY_LEVELS, ProductCatalog
+from app.services.scoring import ScoringEngine
+from app.services.search_index import normalize
+
+SUGGEST_TOP_K = 10
+# longer prefixes are answered by bisection, so the stored tops stay bounded
+MAX_STORED_PREFIX = 10
+
+
+def _common_prefix(a: str, b: str, limit: int) -> int:
+    """Length of the common prefix of `a` and `b`, at most `limit`."""
+    n = min(len(a), len(b), limit)
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class PrefixIndex:
+    """Sorted (key, weight, payload) entries with top-K precomputed for broad prefixes."""
+
+    def __init__(self, entries: List[Tuple[str, float, object]], k: int = SUGGEST_TOP_K):
+        entries = sorted(entries, key=lambda e: e[0])
+        self.k = k
+        self.keys = [e[0] for e in entries]
+        self.weights = np.asarray([e[1] for e in entries], dtype=np.float64)
+        self.payloads = [e[2] for e in entries]
+
+        # keys sharing a prefix are contiguous once sorted, so a prefix has more
+        # than k keys exactly when it is common to keys[j] and keys[j + k] for some j;
+        # prefixes also common to keys[j - 1] were already found at j - 1
+        keys = self.keys
+        broad = []
+        for j in range(len(keys) - k):
+            common = _common_prefix(keys[j], keys[j + k], MAX_STORED_PREFIX)
+            shared = _common_prefix(keys[j - 1], keys[j], common) if j else 0
+            broad.extend(keys[j][:end] for end in range(shared + 1, common + 1))
+        # narrower prefixes are answered from their (small) key range
+        self._top: Dict[str, Tuple[int, ...]] = {
+            prefix: tuple(self._best(*self._range(prefix), k)) for prefix in broad
+        }
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self.keys, prefix)
+        return lo, bisect_left(self.keys, prefix + '￿', lo)
+
+    def _best(self, lo: int, hi: int, n: int) -> List[int]:
+        # most popular first, ties in key order
+        order = np.lexsort((np.arange(lo, hi), -self.weights[lo:hi]))[:n]
+        return (order + lo).tolist()
+
+    def scored(self, prefix: str, n: int = SUGGEST_TOP_K) -> List[Tuple[float, object]]:
+        """(weight, payload) of the (at most k) most popular keys starting with `prefix`, best first."""
+        n = min(n, self.k)
+        if n <= 0 or not prefix:
+            return []
+        ids = self._top.get(prefix)
+        if ids is None:
+            ids = self._best(*self._range(prefix), n)
+        return [(float(self.weights[j]), self.payloads[j]) for j in ids[:n]]
+
+    def top(self, prefix: str, n: int = SUGGEST_TOP_K) -> list:
+        """Payloads of the (at most k) most popular keys starting with `prefix`."""
+        return [payload for _, payload in self.scored(prefix, n)]
+
+
+class SuggestIndex:
+    KEY = 'suggest_index'
+
+    def __init__(self, catalog: ProductCatalog):
+        popularity = ScoringEngine.named('ranking').score_catalog(catalog).tolist()
+
+        # products are found by their name and by "brand name"; twice k so a product
+        # matching both keys still leaves k distinct suggestions
+        product_entries = []
+        for i in range(len(catalog)):
+            name = normalize(catalog.names_lower[i])
+            brand = normalize(catalog.brand_name(i))
+            product_entries.append((name, popularity[i], i))
+            if brand:
+                product_entries.append((f'{brand} {name}', popularity[i], i))
+        self.products = PrefixIndex(product_entries, k=2 * SUGGEST_TOP_K)
+
+        # brands and categories weigh the popularity of all their products (case-insensitively)
+        self.brands = self._table_index(catalog.brands, catalog.brand_ids, popularity, None)
+        self.categories = {
+            level: self._table_index(catalog.categories[level], catalog.category_ids[level], popularity, level)
+            for level in CATEGORY_LEVELS
+        }
+
+    @staticmethod
+    def _table_index(table, column, popularity, level) -> PrefixIndex:
+        weight: Dict[int, float] = {}
+        count: Dict[int, int] = {}
+        canonical = table.canonical
+        for i, sid in enumerate(column):
+            cid = canonical[sid]
+            if cid:
+                weight[cid] = weight.get(cid, 0.0) + popularity[i]
+                count[cid] = count.get(cid, 0) + 1
+        entries = []
+        for cid, w in weight.items():
+            payload = {'name': table.values[cid], 'count': count[cid]}
+            if level:
+                payload['level'] = level
+            entries.append((normalize(table.values[cid]), w, payload))
+        return PrefixIndex(entries)
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'SuggestIndex':
+        return catalog.derived(cls.KEY, cls)
+
+    def product_rows(self, prefix: str, n: int = SUGGEST_TOP_K) -> List[int]:
+        rows = list(dict.fromkeys(self.products.top(normalize(prefix), 2 * n)))
+        return rows[:n]
+
+    def brand_names(self, prefix: str, n: int = SUGGEST_TOP_K) -> List[dict]:
+        return self.brands.top(normalize(prefix), n)
+
+    def category_names(self, prefix: str, n: int = SUGGEST_TOP_K) -> List[dict]:
+        prefix = normalize(prefix)
+        found = []
+        for level in CATEGORY_LEVELS:
+            found.extend(self.categories[level].scored(prefix, n))
+        # one ranking across levels (ties keep primary first), so a rare primary
+        # category does not push out a popular secondary or tertiary one
+        found.sort(key=lambda pair: -pair[0])
+        return [payload for _, payload in found[:n]]
@@ -0,0 +1,109 @@
+"""
+BM25 full-text index over product names, brands, highlights and ingredients.
+
+Built once per catalog generation. Every (field, term) posting list is a
+pair of compact arrays (rows as int32, term frequencies as uint16); a query
+adds up, per term, the boosted and length-normalized frequencies of all
+fields and saturates them once (BM25F), so a name hit outweighs the same
+word buried in a long ingredient list.
+"""
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.catalog import ProductCatalog
+
+# field -> boost; a term in the name counts three times one in the ingredients
+FIELD_BOOSTS = {
+    'name': 3.0,
+    'brand': 2.0,
+    'highlights': 1.5,
+    'ingredients': 1.0,
+}
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or '').lower())
+
+
+class BM25Index:
+    KEY = 'bm25_index'
+
+    def __init__(self, catalog: ProductCatalog):
+        size = len(catalog)
+        self._size = size
+        # list columns are tokenized from their raw literals, so building the
+        # index does not make the catalog cache a parsed list for every row
+        texts = {
+            'name': catalog.names_lower,
+            'brand': [catalog.brand_name(i) for i in range(size)],
+            'highlights': catalog.highlights.raw[:size],
+            'ingredients': catalog.ingredients.raw[:size],
+        }
+        documents: Dict[str, set] = {}
+        self._postings: Dict[str, Dict[str, Tuple[np.ndarray, np.ndarray]]] = {}
+        self._norms: Dict[str, np.ndarray] = {}
+        for field, column in texts.items():
+            lengths = np.zeros(size, dtype=np.float64)
+            postings: Dict[str, Tuple[List[int], List[int]]] = {}
+            for i in range(size):
+                tokens = tokenize(column[i])
+                lengths[i] = len(tokens)
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, tf in counts.items():
+                    rows, tfs = postings.setdefault(token, ([], []))
+                    rows.append(i)
+                    tfs.append(min(tf, 65535))
+                    documents.setdefault(token, set()).add(i)
+            average = lengths.mean() if size and lengths.any() else 1.0
+            # BM25 length normalization: 1 - b + b * len / avg_len, per row
+            self._norms[field] = 1.0 - B + B * lengths / average
+            self._postings[field] = {
+                token: (np.asarray(rows, dtype=np.int32), np.asarray(tfs, dtype=np.uint16))
+                for token, (rows, tfs) in postings.items()
+            }
+        self._idf = {
+            token: math.log(1.0 + (size - len(rows) + 0.5) / (len(rows) + 0.5))
+            for token, rows in documents.items()
+        }
+
+    @classmethod
+    def for_catalog(cls, catalog: ProductCatalog) -> 'BM25Index':
+        return catalog.derived(cls.KEY, cls)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._idf
+
+    def search(self, query: str, rows=None) -> List[Tuple[float, int]]:
+        """(score, row) of every product matching a term of `query`, best first.
+
+        `rows` optionally restricts the result (e.g. to a price range).
+        """
+        scores = np.zeros(self._size, dtype=np.float64)
+        for term in dict.fromkeys(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            weighted = np.zeros(self._size, dtype=np.float64)
+            for field, boost in FIELD_BOOSTS.items():
+                posting = self._postings[field].get(term)
+                if posting is not None:
+                    hits, tfs = posting
+                    weighted[hits] += boost * tfs / self._norms[field][hits]
+            scores += idf * weighted * (K1 + 1.0) / (weighted + K1)
+
+        if rows is not None:
+            allowed = np.zeros(self._size, dtype=bool)
+            allowed[np.asarray(rows, dtype=np.int64)] = True
+            scores[~allowed] = 0.0
+        found = np.flatnonzero(scores)
+        order = found[np.lexsort((found, -scores[found]))]
+        return list(zip(scores[order].tolist(), order.tolist()))
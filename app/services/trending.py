@@ -0,0 +1,135 @@
+"""
+Trending products from user interaction events.
+
+Events (product views, search result clicks, favorites) update an in-memory,
+exponentially time-decayed score per product. Event counts are buffered
+and written to MongoDB as one bulk `$inc` batch per flush interval instead
+of one write per event. Readers never scan the scores: a top-K list is
+recomputed every few seconds and swapped in as one object.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+EVENT_WEIGHTS = {
+    'view': 1.0,
+    'search_click': 2.0,
+    'favorite': 5.0,
+}
+
+DEFAULT_HALF_LIFE = 6 * 3600.0
+DEFAULT_TOP_K = 500
+# decayed scores below this are dropped on refresh to keep the table small
+MIN_SCORE = 0.01
+
+
+class TrendingTracker:
+    def __init__(self, half_life: float = DEFAULT_HALF_LIFE, top_k: int = DEFAULT_TOP_K):
+        self._decay = math.log(2) / half_life
+        self._top_k = top_k
+        # product_id -> (score, time the score was last decayed to)
+        self._scores: Dict[str, Tuple[float, float]] = {}
+        # product_id -> {event type: count} not yet written to MongoDB
+        self._pending: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._top: List[Tuple[float, str]] = []
+        self._worker = None
+        self._background_refresh = False
+
+    @staticmethod
+    def _collection():
+        from app import mongoDb
+        return mongoDb.db.product_stats
+
+    def record(self, product_id: str, event_type: str, now: float = None):
+        """Count one event; `event_type` must be a key of EVENT_WEIGHTS."""
+        weight = EVENT_WEIGHTS[event_type]
+        now = time.time() if now is None else now
+        with self._lock:
+            score, at = self._scores.get(product_id, (0.0, now))
+            self._scores[product_id] = (score * math.exp(-self._decay * max(now - at, 0.0)) + weight, now)
+            self._pending[product_id][event_type] += 1
+
+    def refresh(self, now: float = None) -> List[Tuple[float, str]]:
+        """Recompute the top-K (score, product_id) list and publish it."""
+        now = time.time() if now is None else now
+        with self._lock:
+            decayed = {}
+            for pid, (score, at) in self._scores.items():
+                score *= math.exp(-self._decay * max(now - at, 0.0))
+                if score >= MIN_SCORE:
+                    decayed[pid] = (score, now)
+            self._scores = decayed
+        top = heapq.nlargest(self._top_k, ((score, pid) for pid, (score, _) in decayed.items()))
+        self._top = top
+        return top
+
+    def top(self, n: int) -> List[Tuple[float, str]]:
+        """Up to n (score, product_id) pairs from the last refresh, best first."""
+        if not self._background_refresh:
+            # no background refresher (interval 0): compute on read
+            self.refresh()
+        return self._top[:max(n, 0)]
+
+    def flush(self) -> int:
+        """Write buffered event counts to db.product_stats with one bulk $inc.
+
+        Returns the number of products written. On failure the counts are put
+        back into the buffer for the next flush.
+        """
+        from pymongo import UpdateOne
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            if not pending:
+                return 0
+            stamp = datetime.utcnow().isoformat()
+            ops = [
+                UpdateOne({'product_id': pid},
+                          {'$inc': {f'events.{event}': n for event, n in counts.items()},
+                           '$set': {'last_event_at': stamp}},
+                          upsert=True)
+                for pid, counts in pending.items()
+            ]
+            try:
+                self._collection().bulk_write(ops, ordered=False)
+            except Exception:
+                with self._lock:
+                    for pid, counts in pending.items():
+                        for event, n in counts.items():
+                            self._pending[pid][event] += n
+                raise
+            return len(ops)
+
+    def start(self, refresh_interval: float, flush_interval: float):
+        """Refresh the top-K and flush buffered counts on a daemon thread.
+
+        An interval of 0 disables that half; without background refresh the
+        top-K is recomputed on every read.
+        """
+        if self._worker is not None or (refresh_interval <= 0 and flush_interval <= 0):
+            return
+        self._background_refresh = refresh_interval > 0
+        tick = refresh_interval if refresh_interval > 0 else flush_interval
+
+        def run():
+            last_flush = time.monotonic()
+            while True:
+                time.sleep(tick)
+                if self._background_refresh:
+                    self.refresh()
+                if flush_interval > 0 and time.monotonic() - last_flush >= flush_interval:
+                    last_flush = time.monotonic()
+                    try:
+                        self.flush()
+                    except Exception as e:
+                        print(f"Error flushing trending events: {e}")
+
+        self._worker = threading.Thread(target=run, name='trending-refresh', daemon=True)
+        self._worker.start()
@@ -22,6 +22,10 @@ else
     exit 1
 fi
 
+# Compile the catalog snapshot so workers can mmap it instead of parsing the CSV
+echo "🗜️  Building catalog snapshot..."
+python3 /app/scripts/build_catalog_snapshot.py || echo "⚠️  Snapshot build failed, falling back to CSV loading"
+
 # Start Flask application
 echo "🚀 Starting Flask application..."
 exec python3 run.py
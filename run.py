@@ -1,7 +1,12 @@
+import os
 from app import create_app
 
-app = create_app()
+DEBUG = True
+
+# debug 모드의 Werkzeug 리로더는 파일만 감시하는 부모 프로세스와 요청을 받는 자식 프로세스
+# (WERKZEUG_RUN_MAIN 설정됨)로 나뉨: 부모는 요청을 받지 않으므로 카탈로그와 백그라운드 스레드를 시작하지 않음
+reloader_parent = __name__ == "__main__" and DEBUG and not os.environ.get("WERKZEUG_RUN_MAIN")
+app = create_app(start_background=not reloader_parent)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, debug=True)
-2
\ No newline at end of file
+    app.run(host="0.0.0.0", port=8080, debug=DEBUG)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Catalog Snapshot Build Script
+Compiles the unified products CSV into a memory-mappable binary snapshot
+"""
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.catalog import ProductCatalog
+from app.services.catalog_snapshot import write_snapshot, SNAPSHOT_VERSION
+from app.services.product_service import DATASET_PATH, SNAPSHOT_PATH
+
+
+def build_snapshot(csv_path=DATASET_PATH, snapshot_path=SNAPSHOT_PATH):
+    """Parse `csv_path` once and write the snapshot to `snapshot_path`"""
+    print(f"🔄 Compiling {csv_path} (snapshot v{SNAPSHOT_VERSION})...")
+
+    if not os.path.exists(csv_path):
+        print(f"❌ Error: {csv_path} not found")
+        return False
+
+    started = time.time()
+    try:
+        catalog = ProductCatalog.from_csv(csv_path)
+        write_snapshot(catalog, snapshot_path, source_path=csv_path)
+    except Exception as e:
+        print(f"❌ Error building snapshot: {e}")
+        return False
+
+    size_kb = os.path.getsize(snapshot_path) / 1024
+    print(f"✅ Wrote {len(catalog)} products to {snapshot_path} "
+          f"({size_kb:.0f} KB, {time.time() - started:.2f}s)")
+    return True
+
+
+if __name__ == '__main__':
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_PATH
+    sys.exit(0 if build_snapshot(csv_path, snapshot_path) else 1)
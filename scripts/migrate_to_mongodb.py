@@ -3,21 +3,50 @@
 MongoDB Migration Script
 Migrates CSV data to MongoDB for caching and fast queries
 """
-import csv
+import json
 import os
 import sys
 from pymongo import MongoClient, ASCENDING
 from pymongo.errors import BulkWriteError
 
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.catalog_ingest import iter_transformed_chunks
+from app.services.mongo_ranking import MongoRankingBackend
+from app.services.scoring import configure_weight_sets
+
 def get_mongo_client():
     """Get MongoDB client from environment or default"""
     mongo_uri = os.getenv('MONGO_URI', 'mongodb://mongodb:27017/mobile')
     return MongoClient(mongo_uri)
 
+def row_to_document(row):
+    """Convert one CSV row into a products document (runs in ingest worker processes)"""
+    # Convert types
+    try:
+        row['rating'] = float(row['rating']) if row['rating'] else 0.0
+    except:
+        row['rating'] = 0.0
+    
+    try:
+        row['reviews'] = int(row['reviews']) if row['reviews'] else 0
+    except:
+        row['reviews'] = 0
+    
+    # Add metadata
+    row['source'] = 'csv'
+    row['last_updated'] = None
+    return row
+
 def migrate_products_to_mongodb():
     """Migrate products from CSV to MongoDB"""
     print("🔄 Starting product migration to MongoDB...")
     
+    # Score with the same weights as the app (RANKING_WEIGHTS), so stored scores
+    # and the app's per-product rescores use one formula
+    configure_weight_sets(json.loads(os.getenv('RANKING_WEIGHTS') or '{}'))
+    
     # Connect to MongoDB
     client = get_mongo_client()
     db = client.get_database()
@@ -28,6 +57,11 @@ def migrate_products_to_mongodb():
     if existing_count > 0:
         print(f"✅ MongoDB already has {existing_count} products. Skipping migration.")
         print("   (To force re-migration, manually drop the collection first)")
+        if products_collection.count_documents(MongoRankingBackend.stale_filter(), limit=1) > 0:
+            print("🏆 Computing missing or outdated ranking scores (RANKING_WEIGHTS changed)...")
+            scored = MongoRankingBackend.backfill_scores(products_collection)
+            MongoRankingBackend.ensure_indexes(products_collection)
+            print(f"✅ Ranking scores computed for {scored} products")
         return True
     
     # CSV file path
@@ -37,45 +71,27 @@ def migrate_products_to_mongodb():
         print(f"❌ Error: {csv_path} not found")
         return False
     
-    # Read CSV
-    products = []
+    # Read CSV in chunks (parsed in parallel) and insert each chunk as it arrives,
+    # so only a bounded number of chunks is held in memory at once
+    total_read = 0
+    total_inserted = 0
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Convert types
-                try:
-                    row['rating'] = float(row['rating']) if row['rating'] else 0.0
-                except:
-                    row['rating'] = 0.0
-                
-                try:
-                    row['reviews'] = int(row['reviews']) if row['reviews'] else 0
-                except:
-                    row['reviews'] = 0
-                
-                # Add metadata
-                row['source'] = 'csv'
-                row['last_updated'] = None
-                
-                products.append(row)
-        
-        print(f"📊 Read {len(products)} products from CSV")
+        for products in iter_transformed_chunks(csv_path, row_to_document):
+            if not products:
+                continue
+            total_read += len(products)
+            try:
+                result = products_collection.insert_many(products, ordered=False)
+                total_inserted += len(result.inserted_ids)
+            except BulkWriteError as e:
+                total_inserted += e.details['nInserted']
+                print(f"⚠️  Some duplicates skipped: {e.details['nInserted']} inserted")
+            print(f"💾 Inserted {total_inserted}/{total_read} products so far...")
     except Exception as e:
-        print(f"❌ Error reading CSV: {e}")
+        print(f"❌ Error migrating products: {e}")
         return False
-    
-    # Insert products (don't drop existing collection)
-    if products:
-        try:
-            print(f"💾 Inserting {len(products)} products into MongoDB...")
-            result = products_collection.insert_many(products, ordered=False)
-            print(f"✅ Inserted {len(result.inserted_ids)} products")
-        except BulkWriteError as e:
-            print(f"⚠️  Some duplicates skipped: {e.details['nInserted']} inserted")
-        except Exception as e:
-            print(f"❌ Error inserting products: {e}")
-            return False
+
+    print(f"📊 Read {total_read} products from CSV, inserted {total_inserted}")
     
     # Create indexes
     print("🔍 Creating indexes...")
@@ -86,6 +102,12 @@ def migrate_products_to_mongodb():
     products_collection.create_index([("rating", ASCENDING)])
     print("✅ Indexes created")
     
+    # Precomputed ranking score + (category, score) indexes for RANKING_BACKEND=mongo
+    print("🏆 Computing ranking scores...")
+    scored = MongoRankingBackend.backfill_scores(products_collection)
+    MongoRankingBackend.ensure_indexes(products_collection)
+    print(f"✅ Ranking scores computed for {scored} products")
+    
     # Verify
     count = products_collection.count_documents({})
     print(f"✅ Migration complete! Total products in MongoDB: {count}")
@@ -0,0 +1,73 @@
+"""
+Synced products documents are compared with the rows the catalog actually
+uses, and rows patched in place keep the price index in order.
+"""
+import random
+
+from app.services.catalog import CatalogBuilder, normalize_row
+from app.services.catalog_manager import PendingChanges
+from app.services.price_index import PriceIndex
+
+
+def _row(product_id, sku, price, **fields):
+    row = {'product_id': product_id, 'product_name': f'Product {product_id}', 'brand_name': 'Brand',
+           'rating': '4.5', 'reviews': '10', 'loves_count': '100', 'listPrice': price, 'skuId': sku,
+           'primary_category': 'Skincare', 'highlights': "['Vegan', 'Clean']", 'ingredients': ''}
+    row.update(fields)
+    return row
+
+
+def _catalog(rows):
+    builder = CatalogBuilder()
+    for row in rows:
+        builder.add(normalize_row(row))
+    return builder.catalog
+
+
+def test_document_lists_match_csv_literals():
+    catalog = _catalog([_row('P1', 'S1', '$10.00')])
+    refreshed = normalize_row(_row('P1', 'S1', '$10.00', highlights=['Vegan', 'Clean'], ingredients=[]))
+    assert catalog.changed_fields(0, refreshed) == set()
+
+    refreshed = normalize_row(_row('P1', 'S1', '$10.00', highlights=['Vegan'], rating='3.0'))
+    assert catalog.changed_fields(0, refreshed) == {'highlights_raw', 'rating'}
+
+
+def test_multi_sku_prices_compare_after_folding():
+    catalog = _catalog([_row('P1', 'S1', '$10.00'), _row('P1', 'S2', '$25.00')])
+    assert catalog.list_prices[0] == '$10.00 - $25.00'
+    assert catalog.changed_fields(0, normalize_row(_row('P1', 'S2', '$25.00'))) == set()
+
+    changed = catalog.changed_fields(0, normalize_row(_row('P1', 'S2', '$30.00')))
+    assert changed == {'price_max', 'list_price', 'variants'}
+    changed = catalog.changed_fields(0, normalize_row(_row('P1', 'S2', '$25.00', image_url='s2.jpg')))
+    assert changed == {'variants'}
+    catalog.update(0, normalize_row(_row('P1', 'S2', '$30.00')))
+    assert catalog.list_prices[0] == '$10.00 - $30.00'
+
+
+def test_price_moves_match_a_rebuilt_index():
+    rng = random.Random(5)
+    catalog = _catalog([_row(f'P{i}', f'S{i}', f'${rng.randint(0, 8)}.00') for i in range(60)])
+    index = PriceIndex(catalog)
+    for _ in range(300):
+        i, price = rng.randrange(60), float(rng.randint(0, 8))
+        index.move(i, catalog.price_min[i], price)
+        catalog.price_min[i] = price
+        rebuilt = PriceIndex(catalog)
+        assert index.prices == rebuilt.prices and index.rows == rebuilt.rows
+
+
+def test_pending_changes_keep_the_newest_record_per_sku():
+    pending = PendingChanges(delay=0)
+    first = normalize_row(_row('P1', 'S1', '$10.00'))
+    newer = normalize_row(_row('P1', 'S1', '$12.00'))
+    other = normalize_row(_row('P1', 'S2', '$20.00'))
+    pending.add(first)
+    pending.add(other)
+    batch = pending.due()
+    pending.add(newer)
+    pending.discard(batch)
+    assert 'P1' in pending and pending.due() == [newer]
+    pending.discard([newer])
+    assert 'P1' not in pending and pending.due() == []
@@ -0,0 +1,52 @@
+"""
+A catalog written to a snapshot maps back to the same rows; a stale, empty
+or truncated snapshot is ignored so the CSV gets parsed instead.
+"""
+import os
+
+import pytest
+
+from app.services.catalog import ProductCatalog, normalize_row
+from app.services.catalog_snapshot import load_snapshot, write_snapshot
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(REPO_ROOT, 'dataset', 'products_unified.csv')
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    catalog = ProductCatalog.from_csv(DATASET)
+    # one multi-SKU product, so the variants section is not empty
+    row = catalog.record(0)._asdict()
+    catalog.add_variant(0, normalize_row(dict(row, skuId='SKU-2', listPrice='$99.00')))
+    return catalog
+
+
+def test_round_trip(catalog, tmp_path):
+    path = str(tmp_path / 'products.snapshot')
+    write_snapshot(catalog, path, source_path=DATASET)
+    loaded = load_snapshot(path, source_path=DATASET)
+    assert loaded is not None and len(loaded) == len(catalog)
+    assert all(loaded.record(i) == catalog.record(i) for i in range(len(catalog)))
+    assert loaded.multi_variants == catalog.multi_variants
+    assert loaded.highlights[5] == catalog.highlights[5]
+    assert loaded.index_of(catalog.product_ids[7]) == 7
+
+
+def test_stale_snapshot_is_ignored(catalog, tmp_path):
+    source = tmp_path / 'products.csv'
+    source.write_text('product_id\n')
+    path = str(tmp_path / 'products.snapshot')
+    write_snapshot(catalog, path, source_path=str(source))
+    source.write_text('product_id\nP1\n')
+    assert load_snapshot(path, source_path=str(source)) is None
+
+
+@pytest.mark.parametrize('keep', [0, 10, 0.5, -1])
+def test_truncated_snapshot_is_ignored(catalog, tmp_path, keep):
+    path = tmp_path / 'products.snapshot'
+    write_snapshot(catalog, str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:int(len(data) * keep) if isinstance(keep, float) else keep])
+    assert load_snapshot(str(path)) is None
+    assert load_snapshot(str(tmp_path / 'missing.snapshot')) is None
@@ -0,0 +1,44 @@
+"""
+decode_cursor() accepts exactly the cursors encode_cursor() issues for the
+current generation and reports anything else as a CursorError.
+"""
+import base64
+import json
+
+import pytest
+
+from app.services.pagination import CursorError, decode_cursor, encode_cursor
+
+
+def _token(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_round_trip():
+    params = {'query': 'lip', 'mode': None, 'price_min': 10, 'price_max': 25.5}
+    assert decode_cursor(encode_cursor('search', params, 3, 40), 'search', 3) == (params, 40)
+    params = {'category': 'Skincare', 'after': [4.25, 17]}
+    assert decode_cursor(encode_cursor('ranking', params, 1, 0), 'ranking', 1) == (params, 0)
+
+
+@pytest.mark.parametrize('token', [
+    'not base64!',
+    _token([1, 2]),
+    _token({'k': 'search', 'p': {}, 'o': 0}),
+    _token({'k': 'search', 'p': {}, 'g': '3', 'o': 0}),
+    _token({'k': 'search', 'p': {}, 'g': True, 'o': 0}),
+    _token({'k': 'similar', 'p': {}, 'g': 3, 'o': 0}),
+    _token({'k': 'search', 'p': {'sort': 'price'}, 'g': 3, 'o': 0}),
+    _token({'k': 'search', 'p': {'price_min': True}, 'g': 3, 'o': 0}),
+    _token({'k': 'search', 'p': [], 'g': 3, 'o': 0}),
+    _token({'k': 'search', 'p': {}, 'g': 3, 'o': -10}),
+    _token({'k': 'search', 'p': {}, 'g': 3, 'o': 'x'}),
+])
+def test_invalid_cursors(token):
+    with pytest.raises(CursorError, match='invalid cursor'):
+        decode_cursor(token, 'search', 3)
+
+
+def test_cursor_of_another_generation_expires():
+    with pytest.raises(CursorError, match='expired'):
+        decode_cursor(encode_cursor('search', {}, 2, 20), 'search', 3)
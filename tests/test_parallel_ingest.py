@@ -0,0 +1,75 @@
+"""
+Loads a catalog CSV large enough for the parallel (spawn) ingestion path
+through the real entry point, run.py, and checks that the worker processes,
+which re-import the main module, do not start the app's background threads.
+"""
+import csv
+import os
+import subprocess
+import sys
+import textwrap
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(REPO_ROOT, 'dataset', 'products_unified.csv')
+COPIES = 4
+
+DRIVER = textwrap.dedent('''
+    import sys, threading, time
+    sys.path.insert(0, {root!r})
+    from run import app  # the deployed entry point: create_app() at import time
+
+    APP_THREADS = ('catalog-warmup', 'catalog-watcher', 'catalog-mongo-sync', 'trending-refresh')
+
+    if __name__ == '__main__':
+        from app.services.product_service import ProductService
+        deadline = time.time() + 120
+        while not ProductService.catalog_status()['ready'] and time.time() < deadline:
+            time.sleep(0.1)
+        print('PRODUCTS', ProductService.catalog_status()['products'], flush=True)
+    else:
+        # a spawned ingestion worker, which imported this file as __mp_main__
+        started = sorted(t.name for t in threading.enumerate() if t.name in APP_THREADS)
+        print('WORKER_THREADS', ','.join(started) or '-', flush=True)
+''')
+
+
+def _write_large_csv(path):
+    with open(DATASET, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    product_ids = set()
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for copy in range(COPIES):
+            for row in rows:
+                row = dict(row, product_id=f"{row['product_id']}-{copy}")
+                product_ids.add(row['product_id'])
+                writer.writerow(row)
+    return len(product_ids)
+
+
+def test_parallel_load_through_run_py(tmp_path):
+    csv_path = tmp_path / 'products.csv'
+    expected = _write_large_csv(csv_path)
+    driver = tmp_path / 'driver.py'
+    driver.write_text(DRIVER.format(root=REPO_ROOT))
+
+    env = dict(os.environ,
+               CATALOG_DATASET_PATH=str(csv_path),
+               CATALOG_SNAPSHOT_PATH=str(tmp_path / 'missing.snapshot'),
+               # parse in parallel, several chunks per worker
+               CATALOG_PARALLEL_MIN_BYTES='1',
+               CATALOG_PARALLEL_CHUNK_BYTES=str(256 * 1024),
+               CATALOG_SOURCE='csv',
+               CATALOG_EAGER_WARMUP='1')
+    result = subprocess.run([sys.executable, str(driver)], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+
+    lines = result.stdout.splitlines()
+    workers = [line for line in lines if line.startswith('WORKER_THREADS')]
+    assert workers, 'the CSV was not parsed by spawned workers'
+    assert all(line == 'WORKER_THREADS -' for line in workers), workers
+    assert f'PRODUCTS {expected}' in lines, result.stdout
@@ -0,0 +1,51 @@
+"""
+RankedList moves keys between its blocks like a sorted list would, and
+ranking cursors are not shifted by products moving elsewhere in the view.
+"""
+import random
+from bisect import bisect_right, insort
+
+from app.services.pagination import decode_cursor, page
+from app.services.ranking_index import RankedList
+
+
+class SmallBlocks(RankedList):
+    # many blocks even for a few keys, so splits and empty blocks happen
+    BLOCK_SIZE = 4
+
+
+def test_moves_match_a_sorted_list():
+    rng = random.Random(3)
+    for _ in range(200):
+        size = rng.randint(1, 60)
+        scores = {row: float(rng.randint(0, 10)) for row in range(size)}
+        expected = sorted((-score, row) for row, score in scores.items())
+        ranked = SmallBlocks(list(expected))
+        for _ in range(50):
+            row, new_score = rng.randrange(size), float(rng.randint(0, 10))
+            ranked.move(row, scores[row], new_score)
+            expected.remove((-scores[row], row))
+            insort(expected, (-new_score, row))
+            scores[row] = new_score
+            assert ranked.keys == expected and len(ranked) == size
+
+            offset, n = rng.randint(0, size), rng.randint(0, 10)
+            assert ranked.top(n, offset) == [(-neg, i) for neg, i in expected[offset:offset + n]]
+            score, after_row = float(rng.randint(0, 10)), rng.randint(-1, size)
+            start = bisect_right(expected, (-score, after_row))
+            assert ranked.after(score, after_row, n) == [(-neg, i) for neg, i in expected[start:start + n]]
+
+
+def test_cursor_survives_moves_of_other_products():
+    scores = {row: float(100 - row) for row in range(40)}
+    ranked = SmallBlocks(sorted((-score, row) for row, score in scores.items()))
+
+    first, cursor = page(ranked, 'ranking', {}, 1, 0, 10, keyset=True)
+    assert [row for _, row in first] == list(range(10))
+    # a product not shown yet jumps to the top, which shifts every offset by one
+    ranked.move(30, scores[30], 1000.0)
+    assert [row for _, row in ranked.top(10, 10)][0] == 9
+
+    params, offset = decode_cursor(cursor, 'ranking', 1)
+    second, _ = page(ranked, 'ranking', params, 1, offset, 10, keyset=True)
+    assert [row for _, row in second] == list(range(10, 20))
@@ -0,0 +1,70 @@
+"""
+The bounded name search must return exactly what scoring every product does.
+"""
+import os
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from app.services.catalog import ProductCatalog
+from app.services.product_service import ProductService
+from app.services.search_index import RESULT_LIMIT, lcs_counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(REPO_ROOT, 'dataset', 'products_unified.csv')
+
+QUERIES = ['water cream', 'laneige', 'kiehls', 'lip', 'la', 'x', 'vitamin c serum',
+           'the ordinary niacinamide', 'sérum', 'spf 50', 'zzzz', 'a' * 300]
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return ProductCatalog.from_csv(DATASET)
+
+
+def _full_scan(catalog, query, rows=None):
+    """The original search: score every product (or every row of `rows`)."""
+    brand_boost = [0.2 if query in b else 0.0 for b in catalog.brands.lower]
+    matcher = SequenceMatcher(None, query)
+    scored = []
+    for i in (range(len(catalog)) if rows is None else sorted(rows)):
+        name = catalog.names_lower[i]
+        matcher.set_seq2(name)
+        score = matcher.ratio()
+        if query in name:
+            score += 0.3
+        score += brand_boost[catalog.brand_ids[i]]
+        if score > 0.1:
+            scored.append((score, i))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[:RESULT_LIMIT]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_search_matches_full_scan(catalog, query):
+    assert ProductService._search_ordering(catalog, query) == _full_scan(catalog, query)
+
+
+@pytest.mark.parametrize('query', QUERIES[:4])
+def test_search_in_price_range_matches_full_scan(catalog, query):
+    rows = [i for i in range(len(catalog)) if 10 <= catalog.price_min[i] <= 30]
+    assert ProductService._search_ordering(catalog, query, rows) == _full_scan(catalog, query, rows)
+
+
+def _lcs(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def test_lcs_counter_matches_dynamic_programming():
+    rng = random.Random(7)
+    for _ in range(500):
+        a = ''.join(rng.choice('abcé ') for _ in range(rng.randint(0, 12)))
+        b = ''.join(rng.choice('abcé ') for _ in range(rng.randint(0, 12)))
+        assert lcs_counter(a)(b) == _lcs(a, b), (a, b)
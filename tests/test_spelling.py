@@ -0,0 +1,83 @@
+"""
+edit_distance() is the optimal string alignment distance, and SpellingIndex
+corrects a word like checking it against the whole vocabulary would.
+"""
+import os
+import random
+
+import pytest
+
+from app.services.catalog import ProductCatalog
+from app.services.spelling import MAX_EDIT_DISTANCE, MIN_WORD_LENGTH, SpellingIndex, edit_distance
+from app.services.text_index import BM25Index, tokenize
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(REPO_ROOT, 'dataset', 'products_unified.csv')
+
+
+def _osa(a, b):
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+def test_edit_distance_matches_full_table():
+    rng = random.Random(4)
+    for _ in range(2000):
+        a = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 8)))
+        b = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 8)))
+        expected = _osa(a, b)
+        assert edit_distance(a, b) == expected, (a, b)
+        for limit in range(4):
+            assert edit_distance(a, b, limit) == min(expected, limit + 1), (a, b, limit)
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return ProductCatalog.from_csv(DATASET)
+
+
+def _vocabulary(catalog):
+    counts = {}
+    for i in range(len(catalog)):
+        for word in set(tokenize(catalog.names_lower[i])) | set(tokenize(catalog.brand_name(i))):
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+def _typo(rng, word):
+    k = rng.randrange(len(word))
+    edit = rng.choice('dist')
+    if edit == 'd':
+        return word[:k] + word[k + 1:]
+    if edit == 'i':
+        return word[:k] + rng.choice('aeiouxz') + word[k:]
+    if edit == 's':
+        return word[:k] + rng.choice('aeiouxz') + word[k + 1:]
+    return word[:k] + word[k + 1:k + 2] + word[k:k + 1] + word[k + 2:]
+
+
+def test_corrections_match_a_vocabulary_scan(catalog):
+    counts = _vocabulary(catalog)
+    terms = BM25Index.for_catalog(catalog)
+    index = SpellingIndex.for_catalog(catalog)
+    candidates = [w for w in counts if len(w) >= MIN_WORD_LENGTH - MAX_EDIT_DISTANCE and not w.isdigit()]
+    rng = random.Random(9)
+    words = sorted(w for w in counts if len(w) >= MIN_WORD_LENGTH and not any(c.isdigit() for c in w))
+    checked = 0
+    for word in rng.sample(words, 200):
+        typo = _typo(rng, _typo(rng, word) if rng.random() < 0.3 else word)
+        if len(typo) < MIN_WORD_LENGTH or typo in counts or typo in terms or any(c.isdigit() for c in typo):
+            continue
+        distance = 1 if len(typo) <= 5 else MAX_EDIT_DISTANCE
+        # the distance is at least the difference in length
+        ranked = [(_osa(typo, c), -counts[c], c) for c in candidates if abs(len(c) - len(typo)) <= distance]
+        best = min((r for r in ranked if r[0] <= distance), default=None)
+        assert index.correct_word(typo) == (best[2] if best else typo), typo
+        checked += 1
+    assert checked > 50
+    assert index.correct('Hydratng  SERUM') == 'hydrating  serum'
@@ -0,0 +1,26 @@
+"""
+PrefixIndex answers every prefix like a scan over all of its keys would.
+"""
+import random
+
+from app.services.suggest_index import PrefixIndex
+
+
+def _scan(entries, prefix, n, k):
+    # keys in sorted order, then most popular first (a stable sort keeps ties in key order)
+    matching = [e for e in sorted(entries, key=lambda e: e[0]) if e[0].startswith(prefix)]
+    matching.sort(key=lambda e: -e[1])
+    return [(float(weight), payload) for _, weight, payload in matching[:min(n, k)]]
+
+
+def test_prefixes_match_a_full_scan():
+    rng = random.Random(2)
+    for k in (1, 3, 10):
+        entries = [(''.join(rng.choice('abc ') for _ in range(rng.randint(0, 14))), float(rng.randint(0, 5)), i)
+                   for i in range(400)]
+        index = PrefixIndex(entries, k=k)
+        prefixes = {key[:end] for key, _, _ in entries for end in range(1, len(key) + 1)} | {'d', 'ab d'}
+        for prefix in prefixes:
+            for n in (1, k, k + 5):
+                assert index.scored(prefix, n) == _scan(entries, prefix, n, k), (k, prefix, n)
+        assert index.top('', 5) == []